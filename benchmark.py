@@ -0,0 +1,165 @@
+# lmarolda - benchmarks
+
+import time
+import sys
+import subprocess
+import numpy as np
+from pricer import BlackScholes
+from volatility import ImpliedVolatility
+
+class Benchmark(object):
+
+    def __init__(self):
+
+        return
+
+    @staticmethod
+    def timeit(f, repeat = 3):
+
+        # best of a few runs, in seconds
+        best = float("inf")
+        for i in range(repeat):
+            start = time.perf_counter()
+            f()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    @staticmethod
+    def randombook(n, seed = 0):
+
+        rng = np.random.default_rng(seed)
+        typ = rng.choice(["C", "P"], n)
+        S = rng.uniform(50, 150, n)
+        K = rng.uniform(50, 150, n)
+        T = rng.uniform(1 / 252, 2, n)
+        r = rng.uniform(0, 0.08, n)
+        q = rng.uniform(0, 0.04, n)
+        sigma = rng.uniform(0.05, 0.8, n)
+        return (typ, S, K, T, r, q, sigma)
+
+    """
+
+    compares the scalar black scholes methods (one call per option) against
+    the vectorized array calls on the same book of n options
+
+    the scalar loop is only timed on a sample and scaled up to n, since
+    looping over 1e6 options takes minutes
+
+    """
+    @staticmethod
+    def vectorized(n = 1000000, sample = 10000):
+
+        book = Benchmark.randombook(n)
+        greeks = ['price', 'delta', 'vega', 'theta', 'rho',
+                  'gamma', 'vanna', 'volga', 'charm', 'veta']
+        rows = list(zip(*[ a[:sample] for a in book ]))
+        print("Options: ", n)
+        for greek in greeks:
+            f = getattr(BlackScholes, greek)
+            # warm up first, so lazy imports (scipy.special) are not timed
+            f(*rows[0])
+            scalar = Benchmark.timeit(lambda: [ f(*row) for row in rows ], 1)
+            scalar *= n / sample
+            vector = Benchmark.timeit(lambda: f(*book))
+            print("%-6s scalar: %9.3fs  array: %7.4fs  speedup: %8.1fx"
+                  % (greek, scalar, vector, scalar / vector))
+
+    """
+
+    a full risk report (price plus all nine greeks) computed with ten
+    separate array calls versus a single fused all_greeks call
+
+    """
+    @staticmethod
+    def fused(n = 1000000):
+
+        book = Benchmark.randombook(n)
+        greeks = ['price'] + BlackScholes.firstorder + BlackScholes.secondorder
+        separate = Benchmark.timeit(lambda: [ getattr(BlackScholes, g)(*book) for g in greeks ])
+        fused = Benchmark.timeit(lambda: BlackScholes.all_greeks(*book))
+        print("Options: ", n)
+        print("separate: %7.4fs  fused: %7.4fs  speedup: %5.1fx"
+              % (separate, fused, separate / fused))
+
+    """
+
+    import time of the numeric modules, each measured in a fresh interpreter
+    so nothing is already cached in sys.modules. also checks that importing
+    them does not pull in matplotlib
+
+    """
+    @staticmethod
+    def importtime(modules = ['pricer'], limit = 0.2, repeat = 5):
+
+        for module in modules:
+            script = ("import time, sys; start = time.perf_counter(); import " + module + "; "
+                      "print(time.perf_counter() - start, 'matplotlib' in sys.modules)")
+            best, plotting = float("inf"), False
+            for i in range(repeat):
+                out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+                elapsed, loaded = out.stdout.split()
+                best = min(best, float(elapsed))
+                plotting = plotting or loaded == "True"
+            print("import %-12s %6.1f ms  matplotlib loaded: %s" % (module, 1000 * best, plotting))
+            assert best < limit, module + " takes longer than " + str(limit) + "s to import"
+            assert not plotting, module + " imports matplotlib"
+
+    """
+
+    batched implied vol on n synthetic quotes priced from known vols,
+    reporting the solve time, status counts and recovered vol error
+
+    """
+    @staticmethod
+    def batchvol(n = 1000000):
+
+        (typ, S, K, T, r, q, sigma) = Benchmark.randombook(n)
+        prices = BlackScholes.price(typ, S, K, T, r, q, sigma)
+        iv = ImpliedVolatility()
+        start = time.perf_counter()
+        (vols, status) = iv.computevolbatch(prices, S, K, T, r, q, typ)
+        elapsed = time.perf_counter() - start
+        converged = status == ImpliedVolatility.CONVERGED
+        print("Quotes: ", n, " time: %.3fs" % elapsed)
+        print("Status counts: ", np.bincount(status, minlength=5))
+        print("Median vol error: %.3e" % np.median(np.abs(vols[converged] - sigma[converged])))
+
+    """
+
+    implied vols of the bundled barchart chain (midpoint prices, T = DTE /
+    365, flat r) with computevolrational and the batched newton / bisection
+    solver computevolbatch, both over the whole chain (calls and puts) in a
+    single call, and the largest difference between the two
+
+    """
+    @staticmethod
+    def rationalvol(path = "data/stock-options-volume-leaders-06-08-2023.csv", r = 0.05):
+
+        import csv
+        with open(path, newline = '') as csvfile:
+            rows = list(csv.reader(csvfile))[1:-1]
+        typ = np.array([ row[2][0] for row in rows ])
+        S = np.array([ float(row[1]) for row in rows ])
+        K = np.array([ float(row[3]) for row in rows ])
+        T = np.array([ float(row[5]) for row in rows ]) / 365
+        prices = np.array([ float(row[7]) for row in rows ])
+        elapsed = Benchmark.timeit(lambda: ImpliedVolatility.computevolrational(prices, S, K, T, r, 0, typ))
+        rational = ImpliedVolatility.computevolrational(prices, S, K, T, r, 0, typ)
+        print("%-20s chain: %4d  time: %8.2f ms  unsolvable: %d"
+              % ("computevolrational", len(prices), 1000 * elapsed, np.isnan(rational).sum()))
+        iv = ImpliedVolatility()
+        elapsed = Benchmark.timeit(lambda: iv.computevolbatch(prices, S, K, T, r, 0, typ))
+        (batch, status) = iv.computevolbatch(prices, S, K, T, r, 0, typ)
+        converged = status == ImpliedVolatility.CONVERGED
+        print("%-20s chain: %4d  time: %8.2f ms  not converged: %d"
+              % ("computevolbatch", len(prices), 1000 * elapsed, (~converged).sum()))
+        both = converged & ~np.isnan(rational)
+        print("max |computevolbatch - computevolrational|: %.3e" % np.abs(batch[both] - rational[both]).max())
+
+if __name__ == "__main__":
+
+    Benchmark.vectorized()
+    # Benchmark.fused()
+    # Benchmark.batchvol()
+    # Benchmark.rationalvol()
+    # Benchmark.importtime(['pricer', 'volatility', 'stockmodel', 'hedging', 'greeks'])
@@ -1,10 +1,8 @@
 # lmarolda - blackscholes
 
-import matplotlib.pyplot as plt
-from mpl_toolkits import mplot3d
 import numpy as np
 import math as m
-from scipy.stats import norm
+from normdist import Normal
 
 class BlackScholes(object):
 
@@ -40,7 +38,7 @@ class BlackScholes(object):
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
         d2 = d1 - (sigma * m.sqrt(tau))
         # now compute the norm dist values
-        n1, n2 = norm.cdf(d1), norm.cdf(d2)
+        n1, n2 = Normal.cdf(d1), Normal.cdf(d2)
         # finally we compute the call price
         C = (S * n1) - (K * m.exp(-r * tau) * n2)
         return C
@@ -95,7 +93,7 @@ class BlackScholes(object):
         if (tau <= 0): tau = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(tau))
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
-        delta = norm.cdf(d1)
+        delta = Normal.cdf(d1)
         return delta
     
     @staticmethod
@@ -123,7 +121,7 @@ class BlackScholes(object):
         if (tau <= 0): tau = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(tau))
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
-        delta = norm.cdf(d1) - 1
+        delta = Normal.cdf(d1) - 1
         return delta
     
     @staticmethod
@@ -152,7 +150,7 @@ class BlackScholes(object):
         factor = 1 / (S * sigma * m.sqrt(tau))
         coef = 1 / (sigma * m.sqrt(tau))
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
-        G = factor * norm.pdf(d1)        
+        G = factor * Normal.pdf(d1)        
         return G
 
     """
@@ -174,7 +172,7 @@ class BlackScholes(object):
         coef = 1 / (sigma * m.sqrt(tau))
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
         # now compute the vega
-        V = S * norm.pdf(d1) * m.sqrt(tau)
+        V = S * Normal.pdf(d1) * m.sqrt(tau)
         return V
 
     """
@@ -199,7 +197,7 @@ class BlackScholes(object):
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
         d2 = d1 - (sigma * m.sqrt(tau))
         # now compute the theta
-        n, p = norm.cdf(d2), norm.pdf(d1)
+        n, p = Normal.cdf(d2), Normal.pdf(d1)
         T1 = -r * K * m.exp(-r * tau) * n
         T2 = ((sigma * S) / (2 * m.sqrt(tau))) * p
         T = T1 - T2
@@ -227,7 +225,7 @@ class BlackScholes(object):
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
         d2 = d1 - (sigma * m.sqrt(tau))
         # now compute the theta
-        n, p = norm.cdf(-d2), norm.pdf(d1)
+        n, p = Normal.cdf(-d2), Normal.pdf(d1)
         T1 = r * K * m.exp(-r * tau) * n
         T2 = ((sigma * S) / (2 * m.sqrt(tau))) * p
         T = T1 - T2
@@ -249,7 +247,7 @@ class BlackScholes(object):
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
         d2 = d1 - (sigma * m.sqrt(tau))
         # now compute the theta
-        N2 = norm.cdf(d2)
+        N2 = Normal.cdf(d2)
         R = K * tau * m.exp(-r * tau) * N2
         return R
 
@@ -269,7 +267,7 @@ class BlackScholes(object):
         d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
         d2 = d1 - (sigma * m.sqrt(tau))
         # now compute the theta
-        N2 = norm.cdf(-d2)
+        N2 = Normal.cdf(-d2)
         R = -K * tau * m.exp(-r * tau) * N2
         return R
 
@@ -0,0 +1,264 @@
+# lmarolda - columnar book of options
+
+import numpy as np
+
+class Book(object):
+
+    """
+
+    compact columnar representation of a strategy / portfolio of options
+
+    every leg lives in contiguous numpy arrays instead of one python object
+    per option, so a 100k leg book is a few MB and can be handed straight to
+    the array kernels in pricer.BlackScholes
+
+    typ: "C" / "P"
+    qty: signed quantity, ex. 3 for long 3 contracts and -2 for short 2
+    mult: contract multiplier, ex. 100 for listed equity options
+    K, T, r, q, sigma: as in pricer.BlackScholes
+
+    aggregating a greek over the book is a single weighted reduction with
+    book.weights (qty * mult), ie. weights @ per leg greeks
+
+    columns are exposed as views over the first len(book) entries, and
+    book[i] / iteration give a lightweight Leg record view over one row
+
+    """
+
+    columns = ("K", "T", "r", "q", "sigma", "qty", "mult")
+
+    def __init__(self, capacity = 16):
+
+        self.n = 0
+        self.__typ = np.empty(capacity, dtype="<U1")
+        self.__data = np.empty((len(Book.columns), capacity))
+
+    def __len__(self):
+
+        return self.n
+
+    def __getitem__(self, i):
+
+        if i < 0: i += self.n
+        if not 0 <= i < self.n: raise IndexError("Book index out of range")
+        return Leg(self, i)
+
+    def __iter__(self):
+
+        for i in range(self.n): yield Leg(self, i)
+
+    @property
+    def typ(self): return self.__typ[:self.n]
+
+    @property
+    def K(self): return self.__data[0, :self.n]
+
+    @property
+    def T(self): return self.__data[1, :self.n]
+
+    @property
+    def r(self): return self.__data[2, :self.n]
+
+    @property
+    def q(self): return self.__data[3, :self.n]
+
+    @property
+    def sigma(self): return self.__data[4, :self.n]
+
+    @property
+    def qty(self): return self.__data[5, :self.n]
+
+    @property
+    def mult(self): return self.__data[6, :self.n]
+
+    @property
+    def weights(self): return self.qty * self.mult
+
+    def append(self, typ, qty, K, T, r, q, sigma, mult = 1):
+
+        # amortized growth, doubling the capacity when full
+        if self.n == len(self.__typ): self.__reserve(2 * max(1, self.n))
+        self.__typ[self.n] = typ
+        self.__data[:, self.n] = (K, T, r, q, sigma, qty, mult)
+        self.n += 1
+
+    def extend(self, typ, qty, K, T, r, q, sigma, mult = 1):
+
+        # bulk append of broadcastable arrays
+        typ, qty, K, T, r, q, sigma, mult = np.broadcast_arrays(typ, qty, K, T, r, q, sigma, mult)
+        count = len(np.atleast_1d(typ))
+        if self.n + count > len(self.__typ): self.__reserve(max(2 * self.n, self.n + count))
+        end = self.n + count
+        self.__typ[self.n:end] = np.ravel(typ)
+        for j, column in enumerate((K, T, r, q, sigma, qty, mult)):
+            self.__data[j, self.n:end] = np.ravel(column)
+        self.n = end
+
+    def remove(self, index):
+
+        # index may be a single leg, a list of legs or a boolean mask
+        keep = np.ones(self.n, dtype=bool)
+        keep[index] = False
+        count = int(keep.sum())
+        self.__typ[:count] = self.typ[keep]
+        self.__data[:, :count] = self.__data[:, :self.n][:, keep]
+        self.n = count
+
+    def copy(self):
+
+        book = Book(max(1, self.n))
+        book.extend(self.typ, self.qty, self.K, self.T, self.r, self.q, self.sigma, self.mult)
+        return book
+
+    def nbytes(self):
+
+        return self.__typ.nbytes + self.__data.nbytes
+
+    def __reserve(self, capacity):
+
+        typ = np.empty(capacity, dtype="<U1")
+        data = np.empty((len(Book.columns), capacity))
+        typ[:self.n] = self.typ
+        data[:, :self.n] = self.__data[:, :self.n]
+        self.__typ, self.__data = typ, data
+
+    ### Conversions ###
+
+    """
+
+    builds a book from any of the existing option containers:
+
+    - a list of pricer.Option ("C" / "P", "Long" / "Short")
+    - a list of greeks.VanillaOption ("CALL" / "PUT", "LONG" / "SHORT"),
+      which carry no rates or vol, so r, q and sigma are given
+    - a hedging.OptionsPortfolio, ie. [ (OptionModel, "LONG"), ... ], or one
+      built over a Book
+    - an existing Book, which is returned as is
+
+    sides may also be given directly as a signed quantity (see position).
+    anything else raises a ValueError
+
+    """
+    @staticmethod
+    def tobook(strategy, r = 0, q = 0, sigma = None):
+
+        if isinstance(strategy, Book): return strategy
+        # an OptionsPortfolio, of OptionModels or itself over a book
+        if hasattr(strategy, "options"): return Book.fromportfolio(strategy)
+        if not isinstance(strategy, (list, tuple)):
+            raise ValueError("Unsupported strategy: " + type(strategy).__name__)
+        if len(strategy) == 0: return Book(1)
+        # VanillaOption legs have a strike / expiry but no rates or vol
+        if hasattr(strategy[0], "strike"):
+            if sigma is None: raise ValueError("VanillaOption legs need a sigma")
+            return Book.fromvanilla(strategy, r, q, sigma)
+        if hasattr(strategy[0], "sigma"): return Book.fromoptions(strategy)
+        raise ValueError("Unsupported option: " + type(strategy[0]).__name__)
+
+    @staticmethod
+    def fromoptions(options):
+
+        book = Book(max(1, len(options)))
+        for o in options:
+            qty = Book.position(o.side, o.quantity)
+            book.append(o.typ, qty, o.K, o.T, o.r, o.q, o.sigma, o.multiplier)
+        return book
+
+    @staticmethod
+    def fromvanilla(options, r, q, sigma):
+
+        book = Book(max(1, len(options)))
+        for o in options:
+            typ = "C" if o.typ == "CALL" else "P"
+            qty = Book.position(o.side, o.quantity)
+            book.append(typ, qty, o.strike, o.expiry, r, q, sigma, o.multiplier)
+        return book
+
+    @staticmethod
+    def fromportfolio(portfolio):
+
+        if isinstance(portfolio.options, Book): return portfolio.options
+        # OptionModel.CALL = 1, OptionModel.PUT = 2
+        book = Book(max(1, len(portfolio.options)))
+        for position in portfolio.options:
+            option = position[0]
+            typ = "C" if option.option == 1 else "P"
+            qty, mult = Book.weight(position)
+            book.append(typ, qty, option.K, option.T, option.r, 0, option.sigma, mult)
+        return book
+
+    @staticmethod
+    def sign(side):
+
+        if side.lower() == "long": return 1
+        elif side.lower() == "short": return -1
+        return 0
+
+    """
+
+    signed quantity of a position. side is either "Long" / "Short" (any
+    case) scaled by quantity, or already a signed number, ex.
+
+    position("Long", 3) = 3, position("SHORT", 2) = -2, position(-1.5) = -1.5
+
+    """
+    @staticmethod
+    def position(side, quantity = 1):
+
+        if isinstance(side, str): return Book.sign(side) * quantity
+        return float(side) * quantity
+
+    @staticmethod
+    def weight(position):
+
+        # (option, side), (option, side, quantity) or
+        # (option, side, quantity, multiplier) portfolio tuples
+        quantity = position[2] if len(position) > 2 else 1
+        multiplier = position[3] if len(position) > 3 else 1
+        return (Book.position(position[1], quantity), multiplier)
+
+class Leg(object):
+
+    """
+
+    record view over a single row of a Book, with the same attributes as
+    pricer.Option so existing per-option code keeps working
+
+    """
+
+    __slots__ = ("book", "i")
+
+    def __init__(self, book, i):
+
+        self.book = book
+        self.i = i
+
+    @property
+    def typ(self): return str(self.book.typ[self.i])
+
+    @property
+    def qty(self): return float(self.book.qty[self.i])
+
+    @property
+    def quantity(self): return abs(self.qty)
+
+    @property
+    def multiplier(self): return float(self.book.mult[self.i])
+
+    @property
+    def side(self): return "Long" if self.qty >= 0 else "Short"
+
+    @property
+    def K(self): return float(self.book.K[self.i])
+
+    @property
+    def T(self): return float(self.book.T[self.i])
+
+    @property
+    def r(self): return float(self.book.r[self.i])
+
+    @property
+    def q(self): return float(self.book.q[self.i])
+
+    @property
+    def sigma(self): return float(self.book.sigma[self.i])
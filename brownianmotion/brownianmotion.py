@@ -1,7 +1,5 @@
 # brownian motion
 
-import matplotlib.pyplot as plt
-from mpl_toolkits import mplot3d
 import numpy as np
 import math as m
 from scipy.stats import bernoulli
@@ -27,6 +25,51 @@ class RandomWalk(object):
         steps = m.floor(num / self.timestep)
         for i in range(steps): self.iterate()
 
+    """
+
+    vectorized walks: many realizations of a D dimensional walk at once,
+    each coordinate an independent +-size walk with up probability p
+
+    num: total time, as in simulate (steps = floor(num / timestep))
+    realizations: number of independent walks R
+    dimensions: D, the y / z of iterate are the first two
+    rng: numpy Generator or seed
+    stepdtype: signed integer type of the +-1 step matrix (int8 is 1 byte a
+               step)
+    dtype: floating point type of the positions, float32 is exact for up to
+           2^24 steps
+
+    returns (t, walks), t of shape (steps,) like x (the time after each
+    step) and walks of shape (R, D, steps), so walks[i, 0] is the y and
+    walks[i, 1] the z of one run of simulate
+
+    the steps are drawn as one (R, D, steps) matrix of +-1 (from raw random
+    bits when p = 0.5) and the walks are its cumulative sum along time,
+    accumulated straight into dtype and scaled by size
+
+    """
+    def walks(self, num, realizations = 1, dimensions = 2, rng = None, stepdtype = np.int8, dtype = np.float32):
+
+        (stepdtype, dtype) = (np.dtype(stepdtype), np.dtype(dtype))
+        if stepdtype.kind != "i": raise ValueError("Steps need a signed integer dtype, not " + str(stepdtype))
+        if dtype.kind != "f": raise ValueError("Positions need a floating point dtype, not " + str(dtype))
+        rng = np.random.default_rng(rng)
+        steps = m.floor(num / self.timestep)
+        t = self.timestep * np.arange(1, steps + 1)
+        shape = (realizations, dimensions, steps)
+        count = realizations * dimensions * steps
+        if self.p == 0.5:
+            up = np.unpackbits(rng.integers(0, 256, (count + 7) // 8, dtype=np.uint8), count=count).reshape(shape)
+        else:
+            up = (rng.random(shape) < self.p).view(np.uint8)
+        # +-1 steps, in place: 2 * up - 1
+        moves = up.view(np.int8).astype(stepdtype, copy=False)
+        moves *= 2
+        moves -= 1
+        walks = np.cumsum(moves, axis=-1, dtype=dtype)
+        walks *= dtype.type(self.size)
+        return (t, walks)
+
     """
     generates next step of RV based on distribution 
     uses scipy bernoulli discrete RV as randomness
@@ -51,18 +94,21 @@ class RandomWalk(object):
 
 if __name__ == "__main__":
 
+    # plotting goes through the lazy layer of the package root
+    import os, sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from plotting import Plotting
+
     #timesteps = [10, 5, 1, 0.5, 0.25, 0.1, 0.01, 0.001, 0.0001]
     #timesteps = [10, 5, 1, 0.5, 0.25, 0.1, 0.01]
     timesteps = [0.001, 0.001, 0.001, 0.001, 0.001]
 
-    fig = plt.figure()
-    ax = plt.axes()
+    data = []
+    # all the walks of a timestep in a single vectorized call
+    for time in sorted(set(timesteps), key=timesteps.index):
 
-    for time in timesteps:
-        
         rw = RandomWalk(0.50, time)
-        rw.simulate(100)
-        plt.plot(rw.x, rw.y, linewidth=2.0)
-        # ax.plot3D(rw.x, rw.y, rw.z)
+        (t, walks) = rw.walks(100, realizations = timesteps.count(time))
+        for y, z in walks: data.append((t, y))
 
-    plt.show()
+    Plotting.lines(data)
@@ -0,0 +1,166 @@
+# lmarolda - memoization of black scholes evaluations
+
+import numpy as np
+from collections import OrderedDict
+from itertools import repeat
+from normdist import Normal
+
+class EvaluationCache(object):
+
+    """
+
+    bounded LRU cache of black scholes evaluations, keyed on
+    (greek, precision, typ, S, K, T, r, q, sigma), where precision is the
+    Normal.precision mode the value was computed in
+
+    entries are stored per greek, so BlackScholes.price and the price field
+    of BlackScholes.all_greeks share the same entries and a redraw asking for
+    a different set of greeks only computes the greeks it has not seen
+
+    maxsize: maximum number of entries, least recently used are evicted
+    quantum: optional quantization of the float inputs in the key, ex. with
+             quantum = 1e-8 inputs within 1e-8 of each other share an entry
+             (the cached value is the one computed for the first of them)
+
+    the cache is opt in: BlackScholes.enablecache(...) installs one and every
+    pricing call then takes usecache = False to bypass it for that call
+
+    """
+
+    active = None
+
+    def __init__(self, maxsize = 100000, quantum = None):
+
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def clear(self):
+
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+
+        return { "hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize }
+
+    def get(self, key):
+
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize: self.entries.popitem(last = False)
+
+    def scalarkey(self, args):
+
+        if self.quantum is None: return (Normal.precision,) + tuple(args)
+        return (Normal.precision, args[0]) + tuple([ round(a / self.quantum) for a in args[1:] ])
+
+    def arraykeys(self, args):
+
+        # one key per (already broadcast, flattened) element
+        columns = [ args[0].tolist() ]
+        for a in args[1:]:
+            if self.quantum is not None: a = np.round(a / self.quantum)
+            columns.append(a.tolist())
+        return list(zip(repeat(Normal.precision), *columns))
+
+    """
+
+    evaluates the greeks in fields for the inputs in args (scalars or
+    broadcastable arrays). compute(fields, *args) must return a dict of
+    field -> values and is only called on the elements (and fields) missing
+    from the cache
+
+    returns a dict of field -> scalar or array of the broadcast shape
+
+    """
+    def evaluate(self, fields, compute, args):
+
+        if not any([ isinstance(a, (np.ndarray, list, tuple)) for a in args ]):
+            return self.__evaluatescalar(fields, compute, args)
+
+        arrays = np.broadcast_arrays(*[ np.asarray(a) for a in args ])
+        shape = arrays[0].shape
+        flat = [ a.ravel() for a in arrays ]
+        keys = self.arraykeys(flat)
+        res = {}
+        # missing[j, i]: field j of element i is not in the cache
+        missing = np.zeros((len(fields), len(keys)), dtype=bool)
+        for j, f in enumerate(fields):
+            values = np.empty(len(keys))
+            for i, key in enumerate(keys):
+                value = self.get((f,) + key)
+                if value is None: missing[j, i] = True
+                else: values[i] = value
+            res[f] = values
+        # the elements missing the same fields go through the kernel together,
+        # asking only for those fields
+        elements = np.flatnonzero(missing.any(axis=0))
+        if len(elements) > 0:
+            (patterns, group) = np.unique(missing[:, elements].T, axis=0, return_inverse=True)
+            for p, pattern in enumerate(patterns):
+                index = elements[group.ravel() == p]
+                need = [ f for (f, m) in zip(fields, pattern) if m ]
+                computed = compute(need, *[ a[index] for a in flat ])
+                for f in need:
+                    values = np.asarray(computed[f], dtype=float)
+                    res[f][index] = values
+                    for i, value in zip(index.tolist(), values.tolist()):
+                        self.put((f,) + keys[i], value)
+
+        for f in fields: res[f] = res[f].reshape(shape)
+        return res
+
+    """
+
+    decorator for the single greek methods of BlackScholes, adding the
+    usecache keyword and routing the call through the active cache
+
+    """
+    @staticmethod
+    def cached(greek):
+
+        def decorate(f):
+            def wrapper(typ, S, K, T, r, q, sigma, usecache = True):
+                cache = EvaluationCache.active
+                if cache is None or not usecache: return f(typ, S, K, T, r, q, sigma)
+                compute = lambda fields, *args: { greek: f(*args) }
+                return cache.evaluate([greek], compute, (typ, S, K, T, r, q, sigma))[greek]
+            wrapper.__name__ = f.__name__
+            wrapper.__doc__ = f.__doc__
+            return wrapper
+        return decorate
+
+    def __evaluatescalar(self, fields, compute, args):
+
+        key = self.scalarkey(args)
+        res = {}
+        missing = []
+        for f in fields:
+            value = self.get((f,) + key)
+            if value is None: missing.append(f)
+            else: res[f] = value
+        if len(missing) > 0:
+            computed = compute(missing, *args)
+            for f in missing:
+                res[f] = computed[f]
+                # unsupported option types come back as Error objects
+                if isinstance(res[f], (float, int)): self.put((f,) + key, res[f])
+        return res
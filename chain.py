@@ -0,0 +1,454 @@
+# lmarolda - options chain loading
+
+import os
+import csv
+import json
+from itertools import islice
+from operator import itemgetter
+import numpy as np
+
+class ChainLoader(object):
+
+    """
+
+    streaming loader for the barchart volume leaders options chain csv
+    (see data/), producing typed numpy columns
+
+    the file is read in chunks of `chunksize` rows: each chunk is parsed
+    into numpy arrays, filtered and appended to preallocated column
+    buffers, so memory stays at one chunk of python strings plus the
+    selected output columns, whatever the size of the file
+
+    columns: name -> (csv header, dtype)
+    - type is "C" / "P" as in Book and BlackScholes
+    - symbol and time are sized from the data (the longest value read), so
+      long symbols are never truncated into each other
+    - expiry is a datetime64[D]
+    - iv is a fraction, ie. "62.91%" -> 0.6291
+    - missing numbers ("", "N/A", "unch") are nan, or 0 for integer columns
+
+    the trailing "Downloaded from Barchart..." footer row is detected and
+    skipped, as is any other row with a single field
+
+    """
+
+    # layout version of the binary cache
+    version = 3
+
+    columns = {
+        "symbol": ("Symbol", "U"),
+        "price": ("Price", float),
+        "type": ("Type", "U1"),
+        "strike": ("Strike", float),
+        "expiry": ("Exp Date", "datetime64[D]"),
+        "dte": ("DTE", np.int64),
+        "bid": ("Bid", float),
+        "mid": ("Midpoint", float),
+        "ask": ("Ask", float),
+        "last": ("Last", float),
+        "volume": ("Volume", np.int64),
+        "openinterest": ("Open Int", np.int64),
+        "voloi": ("Vol/OI", float),
+        "iv": ("IV", float),
+        "time": ("Time", "U")
+    }
+
+    """
+
+    path: csv file
+    columns: names of the columns to keep (projection), defaults to all
+    where: row filters applied while streaming, a dict of column ->
+           - a callable taking the column array and returning a boolean mask
+           - a single value or list of values the column must be one of
+           ex. { "type": "C", "dte": lambda dte: dte <= 30 }
+           filter columns do not need to be in the projection
+    chunksize: rows parsed at a time
+
+    returns a dict of column name -> numpy array
+
+    """
+    @staticmethod
+    def load(path, columns = None, where = None, chunksize = 100000):
+
+        if columns is None: columns = list(ChainLoader.columns)
+        buffers = { c: np.empty(0, dtype=ChainLoader.columns[c][1]) for c in columns }
+        n = 0
+        for chunk in ChainLoader.chunks(path, columns, where, chunksize):
+            count = len(chunk[columns[0]])
+            # amortized growth, doubling the capacity when full, and string
+            # columns widened to the longest value seen so far
+            capacity = len(buffers[columns[0]])
+            if n + count > capacity: capacity = max(2 * capacity, n + count)
+            for c in columns:
+                dtype = np.promote_types(buffers[c].dtype, chunk[c].dtype)
+                if capacity == len(buffers[c]) and dtype == buffers[c].dtype: continue
+                grown = np.empty(capacity, dtype=dtype)
+                grown[:n] = buffers[c][:n]
+                buffers[c] = grown
+            for c in columns: buffers[c][n:n + count] = chunk[c]
+            n += count
+        return { c: buffers[c][:n].copy() for c in columns }
+
+    """
+
+    generator over the filtered, projected chunks of the file, each a dict
+    of column name -> numpy array (see load for the arguments). use it
+    directly to reduce a file that does not fit in memory
+
+    """
+    @staticmethod
+    def chunks(path, columns = None, where = None, chunksize = 100000):
+
+        if columns is None: columns = list(ChainLoader.columns)
+        if where is None: where = {}
+        for c in list(columns) + list(where):
+            if c not in ChainLoader.columns: raise ValueError("Unknown chain column: " + str(c))
+        # filter columns are parsed too, but only the projection is returned
+        needed = list(columns) + [ c for c in where if c not in columns ]
+
+        with open(path, newline = '') as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader)
+            index = ChainLoader.__index(header, needed)
+            while True:
+                rows = list(islice(reader, chunksize))
+                if len(rows) == 0: break
+                # the footer and blank lines have a single field
+                if min(map(len, rows)) <= 1: rows = [ row for row in rows if len(row) > 1 ]
+                if len(rows) > 0: yield ChainLoader.__parse(rows, index, columns, where)
+
+    ### Binary cache ###
+
+    """
+
+    parsed chains are cached next to the csv in <path>.npy/, one .npy file
+    per column plus schema.json recording the row count, the column dtypes
+    and the size / mtime of the source csv
+
+    cached(path) reopens the columns with np.load(mmap_mode='r'), so only
+    the pages actually touched are read from disk. the cache is rebuilt
+    from the full csv whenever the source size or mtime no longer match
+    the schema. columns and where behave as in load: projected columns
+    are zero copy memory maps, filtered ones are copies of the selected rows
+
+    rows are stored in OptionChain order (symbol, expiry, type, strike), so
+    an OptionChain over the cached columns keeps the memory maps
+
+    """
+    @staticmethod
+    def cached(path, columns = None, where = None, directory = None):
+
+        if directory is None: directory = path + ".npy"
+        if not ChainLoader.iscurrent(path, directory):
+            ChainLoader.save(OptionChain(ChainLoader.load(path)).columns, directory, path)
+        if columns is None: columns = list(ChainLoader.schema(directory)["columns"])
+        if where is None: where = {}
+        chain = ChainLoader.open(directory, list(columns) + [ c for c in where if c not in columns ])
+        if len(where) == 0: return { c: chain[c] for c in columns }
+        mask = ChainLoader.__mask(chain, where, ChainLoader.schema(directory)["rows"])
+        return { c: chain[c][mask] for c in columns }
+
+    @staticmethod
+    def save(chain, directory, source = None):
+
+        os.makedirs(directory, exist_ok = True)
+        schema = { "version": ChainLoader.version, "columns": {}, "rows": 0, "source": None }
+        for c in chain:
+            np.save(os.path.join(directory, c + ".npy"), np.ascontiguousarray(chain[c]), allow_pickle = False)
+            schema["columns"][c] = chain[c].dtype.str
+            schema["rows"] = len(chain[c])
+        if source is not None:
+            stat = os.stat(source)
+            schema["source"] = { "path": os.path.abspath(source), "size": stat.st_size, "mtime": stat.st_mtime_ns }
+        # the schema is written last, a cache without one is incomplete
+        temporary = os.path.join(directory, "schema.json.tmp")
+        with open(temporary, "w") as f: json.dump(schema, f, indent = 1)
+        os.replace(temporary, os.path.join(directory, "schema.json"))
+
+    @staticmethod
+    def open(directory, columns = None):
+
+        schema = ChainLoader.schema(directory)
+        if schema is None: raise ValueError("No chain cache in: " + str(directory))
+        if not columns: columns = list(schema["columns"])
+        chain = {}
+        for c in columns:
+            if c not in schema["columns"]: raise ValueError("Chain cache has no column: " + str(c))
+            chain[c] = np.load(os.path.join(directory, c + ".npy"), mmap_mode = 'r', allow_pickle = False)
+        return chain
+
+    @staticmethod
+    def schema(directory):
+
+        try:
+            with open(os.path.join(directory, "schema.json")) as f: return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def iscurrent(path, directory):
+
+        schema = ChainLoader.schema(directory)
+        if schema is None or schema.get("version") != ChainLoader.version or schema.get("source") is None: return False
+        stat = os.stat(path)
+        return schema["source"]["size"] == stat.st_size and schema["source"]["mtime"] == stat.st_mtime_ns
+
+    @staticmethod
+    def __index(header, names):
+
+        header = [ h.strip() for h in header ]
+        index = {}
+        for c in names:
+            title = ChainLoader.columns[c][0]
+            if title not in header: raise ValueError("Chain file has no column: " + title)
+            index[c] = header.index(title)
+        return index
+
+    @staticmethod
+    def __parse(rows, index, columns, where):
+
+        # only the projected and filtered fields are pulled out of the rows
+        chunk = { c: ChainLoader.__column(c, list(map(itemgetter(index[c]), rows))) for c in index }
+        mask = ChainLoader.__mask(chunk, where, len(rows))
+        if mask.all(): return { c: chunk[c] for c in columns }
+        return { c: chunk[c][mask] for c in columns }
+
+    @staticmethod
+    def __mask(chunk, where, n):
+
+        mask = np.ones(n, dtype=bool)
+        for c in where:
+            condition = where[c]
+            if callable(condition): mask &= np.asarray(condition(chunk[c]), dtype=bool)
+            # values are cast to the column's type (ex. dates), but strings
+            # keep their length so a longer value cannot match a truncation
+            elif chunk[c].dtype.kind == "U": mask &= np.isin(chunk[c], np.atleast_1d(np.asarray(condition, dtype=str)))
+            else: mask &= np.isin(chunk[c], np.atleast_1d(np.asarray(condition, dtype=chunk[c].dtype)))
+        return mask
+
+    @staticmethod
+    def __column(name, values):
+
+        dtype = ChainLoader.columns[name][1]
+        if name == "type": return np.array([ v[:1].upper() for v in values ], dtype=dtype)
+        if dtype != float and dtype != np.int64: return np.array(values, dtype=dtype)
+        if name == "iv": values = [ v.rstrip("%") for v in values ]
+        # the whole column converts in one call unless something is missing
+        try: numbers = np.array(values, dtype=float)
+        except ValueError: numbers = np.array([ ChainLoader.__number(v) for v in values ])
+        if name == "iv": numbers = numbers / 100
+        if dtype == np.int64: return np.nan_to_num(numbers, nan=0).astype(np.int64)
+        return numbers
+
+    @staticmethod
+    def __number(value):
+
+        # thousands separators, "N/A", "unch", ...
+        try: return float(value.replace(",", ""))
+        except ValueError: return np.nan
+
+class OptionChain(object):
+
+    """
+
+    options chain sorted by (symbol, expiry, type, strike), with offset
+    indexes over the sort so lookups are binary searches instead of scans
+
+    columns: dict of column name -> array, ex. from ChainLoader.load or
+             ChainLoader.cached, with at least symbol, expiry, type and strike
+             (and price, the underlying, for atm lookups)
+
+    the rows of a (symbol), (symbol, expiry) or (symbol, expiry, type)
+    selection are contiguous, so sel returns an OptionChain of zero copy
+    views (memory maps stay memory maps). input already in order, ex. a
+    cache saved from an OptionChain, is not copied either
+
+    the indexes are built on the first lookup, O(n) once:
+    - group starts: first row of each (symbol, expiry, type)
+    - symbol starts: first row and first group of each symbol
+    every lookup after that is O(log n)
+
+    """
+
+    keys = ("symbol", "expiry", "type", "strike")
+
+    def __init__(self, columns, sort = True):
+
+        for k in OptionChain.keys:
+            if k not in columns: raise ValueError("OptionChain needs a " + k + " column")
+        if sort and not OptionChain.__issorted(columns):
+            order = np.lexsort(tuple([ columns[k] for k in reversed(OptionChain.keys) ]))
+            columns = { c: np.asarray(columns[c])[order] for c in columns }
+        self.columns = dict(columns)
+        self.n = len(self.columns["strike"])
+        self.__index = None
+
+    def __len__(self):
+
+        return self.n
+
+    def __getitem__(self, column):
+
+        return self.columns[column]
+
+    def __contains__(self, column):
+
+        return column in self.columns
+
+    def symbols(self):
+
+        return self.__lookup()["symbols"]
+
+    def expiries(self, symbol):
+
+        index = self.__lookup()
+        i = self.__symbol(symbol)
+        if i < 0: return index["groupexpiry"][:0]
+        return np.unique(index["groupexpiry"][index["symbolgroup"][i]:index["symbolgroup"][i + 1]])
+
+    """
+
+    rows of symbol [, expiry [, typ]] as an OptionChain of views
+
+    """
+    def sel(self, symbol, expiry = None, typ = None):
+
+        (lo, hi) = self.range(symbol, expiry, typ)
+        return OptionChain({ c: self.columns[c][lo:hi] for c in self.columns }, sort = False)
+
+    """
+
+    row range [lo, hi) of symbol [, expiry [, typ]], empty when not quoted
+
+    """
+    def range(self, symbol, expiry = None, typ = None):
+
+        index = self.__lookup()
+        i = self.__symbol(symbol)
+        if i < 0: return (0, 0)
+        if expiry is None: return (int(index["symbolstart"][i]), int(index["symbolstart"][i + 1]))
+        expiry = np.asarray(expiry, dtype=self.columns["expiry"].dtype)
+        lo, hi = index["symbolgroup"][i], index["symbolgroup"][i + 1]
+        expiries = index["groupexpiry"][lo:hi]
+        lo, hi = lo + np.searchsorted(expiries, expiry, "left"), lo + np.searchsorted(expiries, expiry, "right")
+        if typ is not None:
+            types = index["grouptype"][lo:hi]
+            lo, hi = lo + np.searchsorted(types, typ, "left"), lo + np.searchsorted(types, typ, "right")
+        return (int(index["groupstart"][lo]), int(index["groupstart"][hi]))
+
+    """
+
+    row of the strike nearest to K in (symbol, expiry, typ), -1 if that
+    expiry / type is not quoted. K may be an array of strikes
+
+    """
+    def nearest(self, symbol, expiry, typ, K):
+
+        (lo, hi) = self.range(symbol, expiry, typ)
+        if lo == hi: return np.full(np.shape(K), -1) if np.ndim(K) > 0 else -1
+        strikes = self.columns["strike"][lo:hi]
+        K = np.asarray(K, dtype=float)
+        # the closer of the two strikes around K
+        i = np.searchsorted(strikes, K)
+        above, below = np.minimum(i, hi - lo - 1), np.maximum(i - 1, 0)
+        row = lo + np.where(np.abs(K - strikes[below]) <= np.abs(strikes[above] - K), below, above)
+        return int(row) if np.ndim(row) == 0 else row
+
+    """
+
+    row of the at the money option of (symbol, expiry, typ), ie. the
+    strike nearest to the underlying price
+
+    """
+    def atm(self, symbol, expiry, typ = "C"):
+
+        (lo, hi) = self.range(symbol, expiry, typ)
+        if lo == hi: return -1
+        return self.nearest(symbol, expiry, typ, float(self.columns["price"][lo]))
+
+    """
+
+    integer label of the (symbol, expiry) of every row, the expiry groups
+    of ImpliedVolatility.impliedforwards
+
+    """
+    def expirygroups(self):
+
+        index = self.__lookup()
+        # group starts also split on type, so merge calls and puts back
+        first = np.ones(len(index["groupexpiry"]), dtype=bool)
+        first[1:] = (index["groupsymbol"][1:] != index["groupsymbol"][:-1]) | \
+                    (index["groupexpiry"][1:] != index["groupexpiry"][:-1])
+        codes = np.cumsum(first) - 1
+        return np.repeat(codes, np.diff(index["groupstart"]))
+
+    """
+
+    (prices, S, K, T, typ, groups) inputs of the implied vol solvers: the
+    `price` column (midpoint by default), the underlying, strike, time to
+    expiry dte / daycount, type and expiry groups
+
+    """
+    def quotes(self, price = "mid", daycount = 365):
+
+        return (self.columns[price], self.columns["price"], self.columns["strike"],
+                self.columns["dte"] / daycount, self.columns["type"], self.expirygroups())
+
+    def __symbol(self, symbol):
+
+        symbols = self.__lookup()["symbols"]
+        i = int(np.searchsorted(symbols, symbol))
+        if i == len(symbols) or symbols[i] != symbol: return -1
+        return i
+
+    def __lookup(self):
+
+        if self.__index is not None: return self.__index
+        symbol, expiry, typ = self.columns["symbol"], self.columns["expiry"], self.columns["type"]
+        # a new group starts wherever symbol, expiry or type changes
+        change = np.ones(self.n, dtype=bool)
+        change[1:] = (symbol[1:] != symbol[:-1]) | (expiry[1:] != expiry[:-1]) | (typ[1:] != typ[:-1])
+        groupstart = np.append(np.flatnonzero(change), self.n)
+        newsymbol = np.ones(self.n, dtype=bool)
+        newsymbol[1:] = symbol[1:] != symbol[:-1]
+        symbolstart = np.append(np.flatnonzero(newsymbol), self.n)
+        self.__index = {
+            "groupstart": groupstart,
+            "groupsymbol": symbol[groupstart[:-1]],
+            "groupexpiry": expiry[groupstart[:-1]],
+            "grouptype": typ[groupstart[:-1]],
+            "symbols": symbol[symbolstart[:-1]],
+            "symbolstart": symbolstart,
+            "symbolgroup": np.searchsorted(groupstart, symbolstart)
+        }
+        return self.__index
+
+    @staticmethod
+    def __issorted(columns):
+
+        # lexicographic order of every pair of adjacent rows, in O(n)
+        n = max(0, len(columns["strike"]) - 1)
+        ordered, tied = np.ones(n, dtype=bool), np.ones(n, dtype=bool)
+        for k in OptionChain.keys:
+            a, b = np.asarray(columns[k][:-1]), np.asarray(columns[k][1:])
+            ordered &= ~tied | (a <= b)
+            tied &= a == b
+        return bool(ordered.all())
+
+if __name__ == "__main__":
+
+    path = "data/stock-options-volume-leaders-06-08-2023.csv"
+    chain = ChainLoader.load(path)
+    print("Quotes: ", len(chain["symbol"]))
+    for c in chain: print("%-12s %-14s %s" % (c, chain[c].dtype, chain[c][:3]))
+    # the cache holds the rows in OptionChain order
+    options = OptionChain(chain)
+    cached = ChainLoader.cached(path)
+    print("Cached columns: ", type(cached["strike"]).__name__,
+          all([ np.array_equal(cached[c], options[c]) for c in options.columns ]))
+    expiry = options.expiries("TSLA")[1]
+    calls = options.sel("TSLA", expiry, "C")
+    atm = options.atm("TSLA", expiry, "C")
+    print("TSLA", expiry, "calls: ", len(calls), " atm strike: ", options["strike"][atm], " spot: ", options["price"][atm])
+    calls = ChainLoader.load(path, ["symbol", "strike", "mid", "iv"], { "type": "C", "dte": lambda d: d <= 8 }, chunksize = 64)
+    print("Calls expiring within 8 days: ", len(calls["symbol"]))
@@ -2,15 +2,21 @@
 
 from hedging import *
 from blackscholes import *
+from spotgrid import SpotGrid
+from book import Book
+import pricer
 
 class VanillaOption(object):
 
-    def __init__(self, typ, strike, expiry, side):
+    # side is "LONG" / "SHORT" or a signed quantity, see Book.position
+    def __init__(self, typ, strike, expiry, side, quantity = 1, multiplier = 1):
 
         self.typ = typ
         self.strike = strike
         self.expiry = expiry
         self.side = side
+        self.quantity = quantity
+        self.multiplier = multiplier
 
 class Greek(object):
 
@@ -129,88 +135,98 @@ class Greek(object):
         portfolio = [ o1 ]
         self.vannaspotstructure(portfolio, maxstrike)
 
-    def vannaspotstructure(self, portfolio, maxstrike):
+    """
 
-        ax = plt.axes()
-        spots = []
-        for i in range(maxstrike - 1, 0, -1): spots.append(maxstrike - i)
-        for i in range(maxstrike + 1): spots.append(maxstrike + i)
-        deltas = self.__computedeltaversusvolatility(spots, portfolio)
+    the structures below take a list of VanillaOption, valued at this
+    Greek's r and sigma, or anything else Book.tobook accepts (ex. a Book
+    or a list of pricer.Option), valued at the legs' own r, q and sigma
+
+    """
+    def vannaspotstructure(self, portfolio, maxstrike, spots = None):
+
+        from plotting import Plotting
+        if spots is None: spots = self.__spots(maxstrike)
+        deltas = self.__computedeltaversusvolatility(spots, self.__book(portfolio))
         # plot the gamma profile over spot
-        ax.set_title("Delta vs. Volatility Spot Structure")
-        for i in range(len(deltas)):
-            ax.plot(spots, deltas[i][1], label = "Vol: " + str(deltas[i][0]))
-        plt.legend()
-        plt.show()
+        curves = [ d[1] for d in deltas ]
+        labels = [ "Vol: " + str(d[0]) for d in deltas ]
+        Plotting.spotstructure("Delta vs. Volatility Spot Structure", spots, curves, labels)
 
     def __computedeltaversusvolatility(self, spots, portfolio):
 
         sigmas = [0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5]
-        result = []
+        # call delta of every leg at every spot and vol in one broadcast
+        # call, spots x vols x legs, then reduced over the legs
+        S = np.asarray(spots, dtype=float)[:, None, None]
+        vols = np.asarray(sigmas)[None, :, None]
+        deltas = pricer.BlackScholes.delta("C", S, portfolio.K, portfolio.T, portfolio.r, portfolio.q, vols)
+        deltas = deltas @ portfolio.weights
 
-        for sigma in sigmas:
-            deltas = []
-            for spot in spots:
-                # compute the gamma for each option in the portfolio
-                totaldelta = 0
-                for o in portfolio:
-                    d = BlackScholes.computecalldelta(spot, o.strike, o.expiry, self.r, sigma)
-                    if o.side == "LONG": totaldelta += d
-                    elif o.side == "SHORT": totaldelta -= d
-                deltas.append(totaldelta)
-            result.append((sigma,deltas))
+        return [ (sigma, deltas[:, j].tolist()) for (j, sigma) in enumerate(sigmas) ]
 
-        return result
+    def gammaspotstructure(self, portfolio, maxstrike, spots = None):
 
-    def gammaspotstructure(self, portfolio, maxstrike):
+        from plotting import Plotting
+        if spots is None: spots = self.__spots(maxstrike)
+        gammas = self.__computegammaspotstructure(spots, self.__book(portfolio))
+        # plot the gamma profile over spot
+        Plotting.spotstructure("Gamma Spot Structure", spots, [gammas])
 
-        ax = plt.axes()
-        spots = []
-        for i in range(maxstrike - 1, 0, -1): spots.append(maxstrike - i)
-        for i in range(maxstrike + 1): spots.append(maxstrike + i)
-        gammas = self.__computegammaspotstructure(spots, portfolio)
+    def vegaspotstructure(self, portfolio, maxstrike, spots = None):
+
+        from plotting import Plotting
+        if spots is None: spots = self.__spots(maxstrike)
+        vegas = self.__computevegaspotstructure(spots, self.__book(portfolio))
         # plot the gamma profile over spot
-        ax.set_title("Gamma Spot Structure")
-        ax.plot(spots, gammas)
-        plt.show()
+        Plotting.spotstructure("Vega Spot Structure", spots, [vegas])
+
+    """
+
+    strike aware alternative to the integer spots 1 ... 2 * maxstrike, see
+    SpotGrid.adaptive. pass the result as spots to the structures above
+
+    ex. spots = G.adaptivespots(portfolio, "gamma")
+        G.gammaspotstructure(portfolio, maxstrike, spots)
+
+    """
+    def adaptivespots(self, portfolio, greek = "gamma", tol = 0.001, maxpoints = 256):
 
-    def vegaspotstructure(self, portfolio, maxstrike):
+        portfolio = self.__book(portfolio)
+        widths = portfolio.sigma * np.sqrt(portfolio.T)
+        if greek == "gamma": f = lambda spots: self.__computegammaspotstructure(spots, portfolio)
+        elif greek == "vega": f = lambda spots: self.__computevegaspotstructure(spots, portfolio)
+        elif greek == "vanna":
+            f = lambda spots: np.transpose([ d[1] for d in self.__computedeltaversusvolatility(spots, portfolio) ])
+        else: raise ValueError("Unsupported greek: " + str(greek))
+        return SpotGrid.adaptive(f, portfolio.K, widths, tol = tol, maxpoints = maxpoints)
+
+    def __spots(self, maxstrike):
 
-        ax = plt.axes()
         spots = []
         for i in range(maxstrike - 1, 0, -1): spots.append(maxstrike - i)
         for i in range(maxstrike + 1): spots.append(maxstrike + i)
-        vegas = self.__computevegaspotstructure(spots, portfolio)
-        # plot the gamma profile over spot
-        ax.set_title("Vega Spot Structure")
-        ax.plot(spots, vegas)
-        plt.show()
+        return spots
 
     def __computegammaspotstructure(self, spots, portfolio):
 
-        gammas = []
-        for spot in spots:
-            # compute the gamma for each option in the portfolio
-            totalgamma = 0
-            for o in portfolio:
-                g = BlackScholes.computegamma(spot, o.strike, o.expiry, self.r, self.sigma)
-                if o.side == "LONG": totalgamma += g
-                elif o.side == "SHORT": totalgamma -= g
-            gammas.append(totalgamma)
-        return gammas
+        # gamma of each option in the portfolio, spots x legs in one call
+        S = np.asarray(spots, dtype=float)[:, None]
+        gammas = pricer.BlackScholes.gamma(portfolio.typ, S, portfolio.K, portfolio.T, portfolio.r, portfolio.q,
+                                           portfolio.sigma)
+        return (gammas @ portfolio.weights).tolist()
     
     def __computevegaspotstructure(self, spots, portfolio):
 
-        vegas = []
-        for spot in spots:
-            # compute the gamma for each option in the portfolio
-            totalvega = 0
-            for o in portfolio:
-                v = BlackScholes.computevega(spot, o.strike, o.expiry, self.r, self.sigma)
-                if o.side == "LONG": totalvega += v
-                elif o.side == "SHORT": totalvega -= v
-            vegas.append(totalvega)
-        return vegas
+        # vega of each option in the portfolio, spots x legs in one call
+        S = np.asarray(spots, dtype=float)[:, None]
+        vegas = pricer.BlackScholes.vega(portfolio.typ, S, portfolio.K, portfolio.T, portfolio.r, portfolio.q,
+                                         portfolio.sigma)
+        return (vegas @ portfolio.weights).tolist()
+
+    def __book(self, portfolio):
+
+        # VanillaOption legs carry no rates or vol, they take this Greek's
+        return Book.tobook(portfolio, self.r, 0, self.sigma)
 
 if __name__ == "__main__":
 
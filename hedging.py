@@ -2,6 +2,9 @@
 
 from stockmodel import *
 from blackscholes import *
+from book import Book
+import numpy as np
+import pricer
 
 """
 
@@ -107,37 +110,24 @@ class HedgingPortfolio(object):
 
     def graphoptions(self):
 
-        f, ax = plt.subplots(3, 2)
+        from plotting import Plotting
         # model and plot
         self.model()
         self.deltahedge()
-        # plot the stock
-        ax[0, 0].set_title("Stock")
-        ax[0, 0].plot(self.stock.t, self.stock.st)
-        # plot the error between portfolio and hedge
-        ax[0, 1].set_title("Error")
-        ax[0, 1].plot(self.t, self.error)
-        # plot the options portfolio
-        ax[1, 0].set_title("Portfolio")
-        ax[1, 0].plot(self.options.t, self.options.price)
-        # plot the hedging portfolio
-        ax[1, 1].set_title("Hedging Portfolio")
-        ax[1, 1].plot(self.t, self.ht)
-        # plot the underlying pos
-        ax[2, 0].set_title("Hedge - Underlying Position")
-        ax[2, 0].plot(self.t, self.underlying)
-        # plot the bank pos
-        ax[2, 1].set_title("Hedge - Bank Position")
-        ax[2, 1].plot(self.t, self.bank)
-        f.tight_layout(pad=0.25)
-        plt.show()
+        Plotting.hedge(self)
 
 class OptionsPortfolio(object):
 
+    series = ("price", "delta", "gamma", "vega", "theta", "rho")
+
     def __init__(self, securities):
 
         # list of all options model objects, with position
         # ex. [ (OptionModel1(), "LONG"), (OptionModel2(), "SHORT") ]
+        # positions may also carry a quantity and contract multiplier, and
+        # the side may itself be a signed quantity
+        # ex. [ (OptionModel1(), "LONG", 3), (OptionModel2(), -2.5, 1, 100) ]
+        # or a Book (see book.py), whose legs are then evaluated together
         self.options = securities
         self.t = []
         self.price = []
@@ -149,39 +139,33 @@ class OptionsPortfolio(object):
 
     def model(self, t, st):
         
+        if isinstance(self.options, Book): return self.__modelbook(t, st)
         # for each of the component options, model them
         for o in self.options:
             option = o[0]
             option.model(t, st)
-        # now iterate through and add the values of each component option
+        # signed weight (quantity * multiplier) of each position
+        weights = Book.tobook(self).weights
+        # each series is a single weighted reduction over the legs x steps matrix
         totalsteps = len(t)
-        for i in range(totalsteps):
-            p, d, g, v, th, r = 0, 0, 0, 0, 0, 0
-            for o in self.options:
-                option = o[0]
-                side = o[1]
-                # update values based on position side
-                if (side == "LONG"): 
-                    p += option.price[i]
-                    d += option.delta[i]
-                    g += option.gamma[i]
-                    v += option.vega[i]
-                    th += option.theta[i]
-                    r += option.rho[i]
-                elif (side == "SHORT"): 
-                    p -= option.price[i]
-                    d -= option.delta[i]
-                    g -= option.gamma[i]
-                    v -= option.vega[i]
-                    th -= option.theta[i]
-                    r -= option.rho[i]
-            self.t.append(t[i])
-            self.price.append(p)
-            self.delta.append(d)
-            self.gamma.append(g)
-            self.vega.append(v)
-            self.theta.append(th)
-            self.rho.append(r)
+        self.t.extend(t[:totalsteps])
+        for name in OptionsPortfolio.series:
+            legs = np.array([ getattr(o[0], name)[:totalsteps] for o in self.options ])
+            getattr(self, name).extend((weights @ legs).tolist())
+
+    def __modelbook(self, t, st):
+
+        # every series of every leg in one steps x legs evaluation, with the
+        # time to expiry counted in OptionModel.daycount days per year
+        book = self.options
+        steps = np.asarray(t, dtype=float)[:, None]
+        tau = book.T - steps / OptionModel.daycount
+        S = np.asarray(st, dtype=float)[:, None]
+        legs = pricer.BlackScholes.all_greeks(book.typ, S, book.K, tau, book.r, book.q, book.sigma,
+                                              list(OptionsPortfolio.series))
+        self.t.extend(t)
+        for name in OptionsPortfolio.series:
+            getattr(self, name).extend((legs[name] @ book.weights).tolist())
 
 class OptionModel(object):
 
@@ -308,6 +292,8 @@ class OptionModel(object):
 
 if __name__ == "__main__":
 
+    from plotting import Plotting
+
     # time parameters
     N = 2 * 256
     timestep = 0.1
@@ -323,11 +309,9 @@ if __name__ == "__main__":
         T1, T2, T3 = 2, 2, 2
         V1, V2, V3 = OptionModel.CALL, OptionModel.CALL, OptionModel.CALL
 
-        ax = plt.axes()
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
-        ax.plot(t, st)
         # now build our options models
         om1 = OptionModel(V1, K1, T1, r, vol, stock, timestep)
         om2 = OptionModel(V2, K2, T2, r, vol, stock, timestep)
@@ -336,8 +320,7 @@ if __name__ == "__main__":
         pm = OptionsPortfolio([(om1, "LONG"), (om2, "LONG"), (om3, "LONG")])
         pm.model(t, st)
         # plot the result!
-        ax.plot(pm.t, pm.price)
-        plt.show()
+        Plotting.lines([(t, st), (pm.t, pm.price)])
 
     def graphgreeks():
 
@@ -346,12 +329,9 @@ if __name__ == "__main__":
         T1, T2, T3 = 2, 2, 2
         V1, V2, V3 = OptionModel.CALL, OptionModel.CALL, OptionModel.CALL
 
-        _, ax = plt.subplots(3, 2)
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
-        ax[0, 0].set_title("Stock Price")
-        ax[0, 0].plot(t, st)
         # now build our options models
         om1 = OptionModel(V1, K1, T1, r, vol, stock, timestep)
         om2 = OptionModel(V2, K2, T2, r, vol, stock, timestep)
@@ -359,22 +339,11 @@ if __name__ == "__main__":
         # model the portfolio
         pm = OptionsPortfolio([(om1, "LONG"), (om2, "SHORT"), (om3, "LONG")])
         pm.model(t, st)
-        # plot the delta
-        ax[0, 1].set_title("Delta")
-        ax[0, 1].plot(pm.t, pm.delta)
-        # plot the gamma
-        ax[1, 0].set_title("Gamma")
-        ax[1, 0].plot(pm.t, pm.gamma)
-        # plot the vega
-        ax[1, 1].set_title("Vega")
-        ax[1, 1].plot(pm.t, pm.vega)
-        # plot the theta
-        ax[2, 0].set_title("Theta")
-        ax[2, 0].plot(pm.t, pm.theta)
-        # plot the rho
-        ax[2, 1].set_title("Rho")
-        ax[2, 1].plot(pm.t, pm.rho)
-        plt.show()
+        # plot the stock and the greeks
+        Plotting.panels([("Stock Price", [(t, st)]),
+                         ("Delta", [(pm.t, pm.delta)]), ("Gamma", [(pm.t, pm.gamma)]),
+                         ("Vega", [(pm.t, pm.vega)]), ("Theta", [(pm.t, pm.theta)]),
+                         ("Rho", [(pm.t, pm.rho)])], 3, 2)
 
     def demonstrateparity():
 
@@ -384,19 +353,15 @@ if __name__ == "__main__":
         N = T1 * 256
         V1, V2 = OptionModel.CALL, OptionModel.PUT
 
-        ax = plt.axes()
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
-        ax.plot(t, st)
         # now build our options models
         om1 = OptionModel(V1, K1, T1, r, vol, stock, timestep)
         om2 = OptionModel(V2, K2, T2, r, vol, stock, timestep)
         # model the portfolio
         pm = OptionsPortfolio([(om1, "LONG"), (om2, "SHORT")])
         pm.model(t, st)
-        # plot the result!
-        ax.plot(pm.t, pm.price)
         # now observe the beauty of put call parity!
         finalprice, expectedprice = pm.price[-1], st[-1] - K1
         print("Maturity: N = ", pm.t[-1])
@@ -404,7 +369,8 @@ if __name__ == "__main__":
         print("Stock Price Minus Strike: S - K = ", expectedprice)
         print("Error: = ", finalprice - expectedprice)
         print("That's pretty damn cool!")
-        plt.show()
+        # plot the result!
+        Plotting.lines([(t, st), (pm.t, pm.price)])
 
     def demonstratedelta():
 
@@ -412,20 +378,18 @@ if __name__ == "__main__":
         typ = OptionModel.CALL
         T = 2
 
-        ax = plt.axes()
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
-        ax.plot(t, st)
+        lines = [(t, st)]
         # observe the differences between ITM and OTM calls
         strikes = [50, 55, 60, 65, 70, 75, 80]
         # strikes = [20, 25, 30, 35, 40, 45, 50]
         for strike in strikes:
             om = OptionModel(typ, strike, T, r, vol, stock, timestep)
             om.model(t, st)
-            ax.plot(om.t, om.price, label = "Strike: " + str(strike))
-        plt.legend()
-        plt.show()
+            lines.append((om.t, om.price, "Strike: " + str(strike)))
+        Plotting.panels([(None, lines)])
 
     def demonstratetheta():
 
@@ -433,19 +397,18 @@ if __name__ == "__main__":
         typ = OptionModel.CALL
         T = 2
 
-        ax = plt.axes()
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
+        lines = []
         # observe the differences between ITM and OTM calls
         strikes = [50, 60, 70, 80, 90, 100]
         # strikes = [20, 25, 30, 35, 40, 45, 50]
         for strike in strikes:
             om = OptionModel(typ, strike, T, r, vol, stock, timestep)
             om.model(t, st)
-            ax.plot(om.t, om.theta, label = "Strike: " + str(strike))
-        plt.legend()
-        plt.show()
+            lines.append((om.t, om.theta, "Strike: " + str(strike)))
+        Plotting.panels([(None, lines)])
 
     def plotportfolio():
 
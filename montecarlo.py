@@ -0,0 +1,252 @@
+# lmarolda - reproducible parallel monte carlo
+
+import numpy as np
+import math as m
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from stockmodel import StockModel, Moments
+from pricer import BlackScholes
+
+class MonteCarlo(object):
+
+    """
+
+    monte carlo expectations over StockModel paths, spread over a pool of
+    worker processes
+
+    the M paths are cut into tasks of taskpaths consecutive paths. a task
+    regenerates its own paths from their seed streams (spawned from seed,
+    see StockModel.pathblocks), evaluates the payoff block by block and
+    folds the discounted values into a Moments. the tasks' Moments are then
+    merged in task order
+
+    the tasks and the merge order depend on M and taskpaths only, never on
+    the number of workers, so a seed gives bitwise the same answer with 1 or
+    n workers. tasks share nothing but the seed, so throughput scales with
+    the cores as long as there are several tasks per worker
+
+    payoff(t, st) returns one value per path of a block st (paths x steps),
+    and must be picklable (a module level function, or a partial of one, ex.
+    functools.partial(MonteCarlo.european, K = 100))
+
+    """
+
+    # paths per task, a multiple of StockModel.streampaths
+    taskpaths = 1 << 17
+
+    """
+
+    model: StockModel, M: number of paths, seed: int (None draws one)
+    workers: processes, None for one per core, 1 runs in this process
+    discount: factor applied to every payoff, ex. exp(-r * T)
+    scheme, paths: path scheme and block size, as in StockModel.pathblocks
+
+    returns the Moments of the discounted payoff, ie. the estimate
+    moments.mean and its standard error moments.stderr
+
+    """
+    @staticmethod
+    def run(model, payoff, M, seed = None, workers = None, discount = 1.0, scheme = "exact", paths = 65536):
+
+        # the entropy is fixed here, so every task draws from the same seed
+        seed = np.random.SeedSequence(seed).entropy
+        starts = list(range(0, M, MonteCarlo.taskpaths))
+        stops = [ min(start + MonteCarlo.taskpaths, M) for start in starts ]
+        arguments = (starts, stops, repeat(model), repeat(payoff), repeat(seed), repeat(discount), repeat(scheme),
+                     repeat(paths))
+        if workers == 1 or len(starts) <= 1:
+            results = map(MonteCarlo.task, *arguments)
+            return MonteCarlo.merge(results)
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            # map returns the results in task order, whatever finishes first
+            return MonteCarlo.merge(executor.map(MonteCarlo.task, *arguments))
+
+    """
+
+    one task, run in a worker: the Moments of the discounted payoff of
+    paths start .. stop - 1
+
+    """
+    @staticmethod
+    def task(start, stop, model, payoff, seed, discount, scheme, paths):
+
+        moments = Moments()
+        for (t, st) in model.pathblocks(stop, paths, seed, scheme, first = start):
+            moments.add(discount * np.asarray(payoff(t, st)))
+        return moments
+
+    @staticmethod
+    def merge(results):
+
+        moments = Moments()
+        for result in results: moments.merge(result)
+        return moments
+
+    """
+
+    monte carlo price of payoff with variance reduction, one or several of
+
+    antithetic: every drawn path is paired with its mirror (see
+                StockModel.mirror), and the pair average is one sample
+    controls: control variates, the discounted terminal stock and the
+              discounted payoff of a call struck at strike (default s0) on
+              the same expiry, whose expectations are closed form
+              (s0 * exp(alpha * T), and through pricer.BlackScholes.price).
+              the optimal coefficients beta are the regression of the
+              payoff on the controls over all samples
+    matching: moment matched normals per stream (see StockModel.pathblocks),
+              the average over a stream is one sample, so M must be a
+              multiple of StockModel.streampaths
+
+    the other arguments are those of run, the tasks / merge are the same
+    (now of vectors of samples), so the answer again does not depend on the
+    number of workers. controls and matching need the exact scheme
+
+    returns an Estimate, with the standard error and the variance reduction
+    ratio against plain monte carlo with as many payoff evaluations
+
+    """
+    @staticmethod
+    def price(model, payoff, M, seed = None, workers = None, discount = 1.0, scheme = "exact", paths = 65536,
+              antithetic = False, controls = False, strike = None, matching = False):
+
+        if (controls or matching) and scheme != "exact":
+            raise ValueError("Control variates and moment matching need the exact scheme")
+        if antithetic and scheme != "exact" and model.bm.p != 0.5:
+            raise ValueError("Antithetic bernoulli paths need p = 0.5")
+        chunk = StockModel.streampaths
+        if matching and (M % chunk != 0 or paths % chunk != 0):
+            raise ValueError("Moment matching needs M and paths multiples of " + str(chunk))
+        strike = model.s0 if strike is None else strike
+        seed = np.random.SeedSequence(seed).entropy
+        starts = list(range(0, M, MonteCarlo.taskpaths))
+        stops = [ min(start + MonteCarlo.taskpaths, M) for start in starts ]
+        arguments = (starts, stops, repeat(model), repeat(payoff), repeat(seed), repeat(discount), repeat(scheme),
+                     repeat(paths), repeat(antithetic), repeat(controls), repeat(strike), repeat(matching))
+        if workers == 1 or len(starts) <= 1:
+            results = list(map(MonteCarlo.reducedtask, *arguments))
+        else:
+            with ProcessPoolExecutor(max_workers = workers) as executor:
+                results = list(executor.map(MonteCarlo.reducedtask, *arguments))
+        plain = MonteCarlo.merge(result[0] for result in results)
+        samples = MonteCarlo.merge(result[1] for result in results)
+
+        covariance = np.atleast_2d(samples.variance)
+        (mean, variance, beta) = (samples.mean[0], covariance[0, 0], None)
+        if controls:
+            # expectations of the controls, terminal stock and vanilla call
+            T = model.timestep * m.floor(model.N / model.timestep)
+            growth = m.exp(model.alpha * T)
+            vanilla = growth * BlackScholes.price("C", model.s0, strike, T, model.alpha, 0, model.sigma)
+            expected = discount * np.array([model.s0 * growth, vanilla])
+            beta = np.linalg.solve(covariance[1:, 1:], covariance[1:, 0])
+            mean = mean - beta @ (samples.mean[1:] - expected)
+            variance = variance - covariance[0, 1:] @ beta
+        stderr = m.sqrt(max(variance, 0) / samples.n)
+        # variance of plain monte carlo for the same number of payoff
+        # evaluations over ours, an antithetic sample evaluates two paths
+        evaluations = plain.n * (2 if antithetic else 1)
+        ratio = plain.variance / evaluations / stderr ** 2 if stderr > 0 else float("inf")
+        return Estimate(float(mean), stderr, ratio, plain, samples, beta)
+
+    """
+
+    one task of price, run in a worker: the Moments of the plain payoff of
+    the drawn paths start .. stop - 1, and the Moments of the samples
+    (payoff and controls, averaged over pairs / streams)
+
+    """
+    @staticmethod
+    def reducedtask(start, stop, model, payoff, seed, discount, scheme, paths, antithetic, controls, strike, matching):
+
+        (plain, samples) = (Moments(), Moments())
+        blocks = model.pathblocks(stop, paths, seed, scheme, first = start, matching = matching)
+        for (t, st) in blocks:
+            values = MonteCarlo.__samples(t, st, payoff, discount, controls, strike)
+            plain.add(values[:, 0])
+            if antithetic: values = (values + MonteCarlo.__samples(t, model.mirror(t, st), payoff, discount,
+                                                                  controls, strike)) / 2
+            if matching: values = values.reshape(-1, StockModel.streampaths, values.shape[1]).mean(axis=1)
+            samples.add(values)
+        return (plain, samples)
+
+    @staticmethod
+    def __samples(t, st, payoff, discount, controls, strike):
+
+        # columns payoff, terminal stock, vanilla call, all discounted
+        columns = [ np.asarray(payoff(t, st), dtype=float) ]
+        if controls: columns += [ st[:, -1], np.maximum(st[:, -1] - strike, 0) ]
+        return discount * np.column_stack(columns)
+
+    """
+
+    payoff of a european call (typ = "C") or put (typ = "P") struck at K,
+    on the last column of the paths
+
+    """
+    @staticmethod
+    def european(t, st, K, typ = "C"):
+
+        w = 1 if typ == "C" else -1
+        return np.maximum(w * (st[:, -1] - K), 0)
+
+"""
+
+result of MonteCarlo.price
+
+mean, stderr: the estimate and its standard error
+ratio: variance reduction at equal cost, the variance of plain monte
+       carlo with as many payoff evaluations (twice the drawn paths with
+       antithetic, which also evaluates every mirror) over the variance of
+       the estimate, ie. the factor by which the work can be cut for the
+       same confidence interval
+plain: Moments of the plain discounted payoff of the drawn paths
+samples: Moments of the (payoff, controls) samples
+beta: control variate coefficients, None without controls
+
+"""
+class Estimate(object):
+
+    def __init__(self, mean, stderr, ratio, plain, samples, beta = None):
+
+        self.mean = mean
+        self.stderr = stderr
+        self.ratio = ratio
+        self.plain = plain
+        self.samples = samples
+        self.beta = beta
+
+    def __repr__(self):
+
+        return "Estimate(%.6f +- %.6f, variance reduction %.1fx)" % (self.mean, self.stderr, self.ratio)
+
+"""
+
+payoff of an arithmetic average price call struck at K, the average being
+over all the path's steps after the start (module level, so picklable)
+
+"""
+def asian(t, st, K):
+
+    return np.maximum(st[:, 1:].mean(axis=1) - K, 0)
+
+if __name__ == "__main__":
+
+    import time
+    from functools import partial
+
+    # one year call at the money, daily steps, under the risk neutral measure
+    (S0, K, T, r, vol) = (100, 100, 1.0, 0.05, 0.2)
+    model = StockModel(T, S0, r, vol, 1 / 256)
+    payoff = partial(MonteCarlo.european, K = K)
+    print("Black Scholes: ", BlackScholes.price("C", S0, K, T, r, 0, vol))
+    for workers in (1, 2, 4):
+        start = time.perf_counter()
+        moments = MonteCarlo.run(model, payoff, 1000000, seed = 42, workers = workers, discount = m.exp(-r * T))
+        print("%d workers: %.6f +- %.6f in %.2fs" % (workers, moments.mean, moments.stderr, time.perf_counter() - start))
+
+    # variance reduction on an average price call, no closed form
+    for options in ({}, { "antithetic": True }, { "matching": True }, { "controls": True },
+                    { "antithetic": True, "controls": True, "matching": True }):
+        estimate = MonteCarlo.price(model, partial(asian, K = K), 262144, seed = 42, discount = m.exp(-r * T), **options)
+        print("Asian", options, estimate)
@@ -0,0 +1,146 @@
+# lmarolda - plotting
+
+class Plotting(object):
+
+    """
+
+    all of the matplotlib drawing lives here. matplotlib is only imported
+    the first time something is actually plotted, so the numeric modules
+    (pricer, volatility, stockmodel, ...) import fast and run on headless
+    workers without a display backend
+
+    the numeric modules only import this module inside their plot methods
+
+    """
+
+    @staticmethod
+    def pyplot():
+
+        import matplotlib.pyplot as plt
+        return plt
+
+    """
+
+    draws Pricer.plot: one subplot per requested series, one line per
+    vol / maturity curve of each PricingGrid
+
+    """
+    @staticmethod
+    def strategy(grids, plots, diffvols, diffmats, vol_titles, mat_titles):
+
+        plt = Plotting.pyplot()
+        numplots = len(plots)
+
+        f, ax = plt.subplots(numplots)
+        f.set_figheight(8)
+        f.set_figwidth(10)
+        if numplots == 1: ax = [ax]
+
+        for i in range(numplots):
+
+            plottype = plots[i]
+            data = grids[plottype].curves()
+
+            for j in range(len(data)):
+                x, y = data[j]
+
+                if plottype == 'payoff': label = plottype
+                else:
+                    if diffvols: label = plottype + vol_titles[j]
+                    elif diffmats: label = plottype + mat_titles[j]
+                    else: label = plottype
+
+                ax[i].plot(x, y, label = label)
+            ax[i].legend(loc='upper right')
+
+        f.tight_layout(pad=0.5)
+        plt.show()
+
+    """
+
+    single axes plot of one or more curves over spot (greeks.Greek)
+    curves: list of y values, labels: optional legend entry per curve
+
+    """
+    @staticmethod
+    def spotstructure(title, spots, curves, labels = None):
+
+        plt = Plotting.pyplot()
+        ax = plt.axes()
+        ax.set_title(title)
+        for i in range(len(curves)):
+            if labels is None: ax.plot(spots, curves[i])
+            else: ax.plot(spots, curves[i], label = labels[i])
+        if labels is not None: plt.legend()
+        plt.show()
+
+    """
+
+    plain line plot of (x, y) pairs, ex. simulated paths
+
+    """
+    @staticmethod
+    def lines(data):
+
+        plt = Plotting.pyplot()
+        ax = plt.axes()
+        for (x, y) in data: ax.plot(x, y)
+        plt.show()
+
+    """
+
+    grid of line plots, ex. Risk.graphgreeks
+    panels: list of (title, lines), title None for none, lines a list of
+            (x, y) or (x, y, label). panels with labels get a legend
+    rows, cols: layout of the grid, one column by default, and a single
+                panel is drawn on plain axes
+
+    """
+    @staticmethod
+    def panels(panels, rows = None, cols = 1):
+
+        plt = Plotting.pyplot()
+        if rows is None: rows = -(-len(panels) // cols)
+        if len(panels) == 1:
+            (f, axes) = (None, [plt.axes()])
+        else:
+            f, axes = plt.subplots(rows, cols)
+            axes = axes.ravel()
+        for (ax, (title, lines)) in zip(axes, panels):
+            if title is not None: ax.set_title(title)
+            for line in lines: ax.plot(line[0], line[1], **({ "label": line[2] } if len(line) > 2 else {}))
+            if any(len(line) > 2 for line in lines): ax.legend()
+        if f is not None: f.tight_layout(pad=0.25)
+        plt.show()
+
+    """
+
+    draws HedgingPortfolio.graphoptions: the stock, tracking error, options
+    portfolio, hedging portfolio and both legs of the hedge
+
+    """
+    @staticmethod
+    def hedge(h):
+
+        plt = Plotting.pyplot()
+        f, ax = plt.subplots(3, 2)
+        # plot the stock
+        ax[0, 0].set_title("Stock")
+        ax[0, 0].plot(h.stock.t, h.stock.st)
+        # plot the error between portfolio and hedge
+        ax[0, 1].set_title("Error")
+        ax[0, 1].plot(h.t, h.error)
+        # plot the options portfolio
+        ax[1, 0].set_title("Portfolio")
+        ax[1, 0].plot(h.options.t, h.options.price)
+        # plot the hedging portfolio
+        ax[1, 1].set_title("Hedging Portfolio")
+        ax[1, 1].plot(h.t, h.ht)
+        # plot the underlying pos
+        ax[2, 0].set_title("Hedge - Underlying Position")
+        ax[2, 0].plot(h.t, h.underlying)
+        # plot the bank pos
+        ax[2, 1].set_title("Hedge - Bank Position")
+        ax[2, 1].plot(h.t, h.bank)
+        f.tight_layout(pad=0.25)
+        plt.show()
@@ -1,10 +1,11 @@
 # lmarolda - blackscholes
 
-import matplotlib.pyplot as plt
-from mpl_toolkits import mplot3d
 import numpy as np
 import math as m
-from scipy.stats import norm
+from normdist import Normal
+from spotgrid import SpotGrid
+from book import Book
+from bscache import EvaluationCache
 
 class Error(object):
 
@@ -20,8 +21,13 @@ class BlackScholes(object):
     ### Pricing ###
 
     @staticmethod
+    @EvaluationCache.cached("price")
     def price(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arrayprice(g)
+
         # need to ensure T does not reach 0 or below (float pt in python)
         if (T <= 0):
             if typ == "C": return max(0, S - K)
@@ -33,9 +39,9 @@ class BlackScholes(object):
         d2 = d1 - (sigma * m.sqrt(T))
         # finally we compute the option price
         if typ == "C": 
-            price = (S * m.exp(-q * T) * norm.cdf(d1)) - (K * m.exp(-r * T) * norm.cdf(d2))
+            price = (S * m.exp(-q * T) * Normal.cdf(d1)) - (K * m.exp(-r * T) * Normal.cdf(d2))
         elif typ == "P": 
-            price = (K * m.exp(-r * T) * norm.cdf(-d2)) - (S * m.exp(-q * T) * norm.cdf(-d1))
+            price = (K * m.exp(-r * T) * Normal.cdf(-d2)) - (S * m.exp(-q * T) * Normal.cdf(-d1))
         else: price = Error()
 
         return price
@@ -43,56 +49,76 @@ class BlackScholes(object):
     ### First Order Greeks ###
 
     @staticmethod
+    @EvaluationCache.cached("delta")
     def delta(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arraydelta(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         # now compute delta
-        if typ == "C": delta = m.exp(-q * T) * norm.cdf(d1)
-        elif typ == "P": delta = -m.exp(-q * T) * norm.cdf(-d1)
+        if typ == "C": delta = m.exp(-q * T) * Normal.cdf(d1)
+        elif typ == "P": delta = -m.exp(-q * T) * Normal.cdf(-d1)
         else: delta = Error()
 
         return delta
     
     @staticmethod
+    @EvaluationCache.cached("vega")
     def vega(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arrayvega(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         # now compute the vega
-        V = S * m.exp(-q * T) * norm.pdf(d1) * m.sqrt(T)
+        V = S * m.exp(-q * T) * Normal.pdf(d1) * m.sqrt(T)
 
         return V
 
     @staticmethod
+    @EvaluationCache.cached("theta")
     def theta(typ, S, K, T, r, q, sigma):
         
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arraytheta(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         d2 = d1 - (sigma * m.sqrt(T))
         # now compute the theta
-        T1 = (-m.exp(-q * T) * S * norm.pdf(d1) * sigma) / (2 * m.sqrt(T))
+        T1 = (-m.exp(-q * T) * S * Normal.pdf(d1) * sigma) / (2 * m.sqrt(T))
         C2 = r * K * m.exp(-r * T)
         C3 = q * S * m.exp(-q * T)
-        if typ == "C": theta = T1 - C2 * norm.cdf(d2) + C3 * norm.cdf(d1)
-        elif typ == "P": theta = T1 + C2 * norm.cdf(-d2) - C3 * norm.cdf(-d1)
+        if typ == "C": theta = T1 - C2 * Normal.cdf(d2) + C3 * Normal.cdf(d1)
+        elif typ == "P": theta = T1 + C2 * Normal.cdf(-d2) - C3 * Normal.cdf(-d1)
         else: theta = Error()
 
         return theta
     
     @staticmethod
+    @EvaluationCache.cached("rho")
     def rho(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arrayrho(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         d2 = d1 - (sigma * m.sqrt(T))
         # now compute the rho
-        if typ == "C": rho = K * T * m.exp(-r * T) * norm.cdf(d2)
-        elif typ == "P": rho = -K * T * m.exp(-r * T) * norm.cdf(-d2)
+        if typ == "C": rho = K * T * m.exp(-r * T) * Normal.cdf(d2)
+        elif typ == "P": rho = -K * T * m.exp(-r * T) * Normal.cdf(-d2)
         else: rho = Error()
 
         return rho
@@ -100,58 +126,83 @@ class BlackScholes(object):
     ### Second Order Greeks ###
 
     @staticmethod
+    @EvaluationCache.cached("gamma")
     def gamma(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arraygamma(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         factor = 1 / (S * sigma * m.sqrt(T))
-        gamma = m.exp(-q * T) * factor * norm.pdf(d1)    
+        gamma = m.exp(-q * T) * factor * Normal.pdf(d1)    
 
         return gamma
     
     @staticmethod
+    @EvaluationCache.cached("vanna")
     def vanna(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arrayvanna(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         d2 = d1 - (sigma * m.sqrt(T))
-        vanna = (-m.exp(-q * T) * norm.pdf(d1) * d2) / sigma
+        vanna = (-m.exp(-q * T) * Normal.pdf(d1) * d2) / sigma
 
         return vanna
     
     @staticmethod
+    @EvaluationCache.cached("volga")
     def volga(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arrayvolga(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         d2 = d1 - (sigma * m.sqrt(T))
         factor = (m.sqrt(T) * d1 * d2) / sigma
-        volga = S * m.exp(-q * T) * norm.pdf(d1) * factor
+        volga = S * m.exp(-q * T) * Normal.pdf(d1) * factor
         
         return volga
 
     @staticmethod
+    @EvaluationCache.cached("charm")
     def charm(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arraycharm(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
         d2 = d1 - (sigma * m.sqrt(T))
-        num = m.exp(-q * T) * norm.pdf(d1) * 2 * (r - q) * T - d2 * sigma * m.sqrt(T)
+        num = m.exp(-q * T) * Normal.pdf(d1) * 2 * (r - q) * T - d2 * sigma * m.sqrt(T)
         denom = 2 * T * sigma * m.sqrt(T)
         term2 = num / denom
-        if typ == "C": charm = q * m.exp(-q * T) * norm.cdf(d1) - term2
-        elif typ == "P": -q * m.exp(-q * T) * norm.cdf(-d1) - term2
+        if typ == "C": charm = q * m.exp(-q * T) * Normal.cdf(d1) - term2
+        elif typ == "P": charm = -q * m.exp(-q * T) * Normal.cdf(-d1) - term2
         else: charm = Error()
 
         return charm
 
     @staticmethod
+    @EvaluationCache.cached("veta")
     def veta(typ, S, K, T, r, q, sigma):
 
+        if BlackScholes.isarray(typ, S, K, T, r, q, sigma):
+            g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+            return BlackScholes.__arrayveta(g)
+
         if (T <= 0): T = BlackScholes.zero
         coef = 1 / (sigma * m.sqrt(T))
         d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
@@ -159,32 +210,274 @@ class BlackScholes(object):
         term1 = ((r - q) * d1) / (sigma * m.sqrt(T))
         term2 = (1 + d1 * d2) / (2 * T)
         coeff = q + term1 - term2
-        veta = -S * m.exp(-q * T) * norm.pdf(d1) * m.sqrt(T) * coeff
+        veta = -S * m.exp(-q * T) * Normal.pdf(d1) * m.sqrt(T) * coeff
 
         return veta
+
+    ### Fused Kernel ###
+
+    firstorder = ['delta', 'vega', 'theta', 'rho']
+    secondorder = ['gamma', 'vanna', 'volga', 'charm', 'veta']
+
+    """
+
+    computes the price plus any subset of the greeks above in a single pass,
+    sharing d1, d2, exp(-qT), exp(-rT), N(d1), N(d2) and N'(d1) across all of
+    them. works for scalars and broadcastable arrays alike
+
+    returns a structured array (or a single record for scalar inputs) with a
+    "price" field followed by one field per requested greek, ex.
+
+    res = BlackScholes.all_greeks("C", 100, 100, 1, 0.05, 0, 0.2, ['delta'])
+    res['price'], res['delta']
+
+    """
+    @staticmethod
+    def all_greeks(typ, S, K, T, r, q, sigma, which = None, usecache = True):
+
+        if which is None: which = BlackScholes.firstorder + BlackScholes.secondorder
+        fields = ['price'] + [ w for w in which if w != 'price' ]
+        args = (typ, S, K, T, r, q, sigma)
+        cache = EvaluationCache.active
+        if cache is None or not usecache: values = BlackScholes.__fused(fields, *args)
+        else: values = cache.evaluate(fields, BlackScholes.__fused, args)
+        shape = np.shape(values['price'])
+        res = np.empty(shape, dtype=[ (f, float) for f in fields ])
+        for f in fields: res[f] = values[f]
+        # scalar inputs give back a single record
+        if len(shape) == 0: return res[()]
+        return res
+
+    @staticmethod
+    def __fused(fields, typ, S, K, T, r, q, sigma):
+
+        g = BlackScholes.__terms(typ, S, K, T, r, q, sigma)
+        values = {}
+        for f in fields: values[f] = BlackScholes.__kernel(f, g)
+        return values
+
+    ### Caching ###
+
+    """
+
+    opt in LRU memoization of every pricing call above, see bscache.py
+
+    cache = BlackScholes.enablecache(maxsize = 100000, quantum = 1e-10)
+    ...
+    cache.stats(), cache.clear()
+    BlackScholes.price(..., usecache = False)   # bypass for a single call
+    BlackScholes.disablecache()
+
+    """
+    @staticmethod
+    def enablecache(maxsize = 100000, quantum = None):
+
+        EvaluationCache.active = EvaluationCache(maxsize, quantum)
+        return EvaluationCache.active
+
+    @staticmethod
+    def disablecache():
+
+        EvaluationCache.active = None
+
+    @staticmethod
+    def __kernel(greek, g):
+
+        if greek == "price": return BlackScholes.__arrayprice(g)
+        elif greek == "delta": return BlackScholes.__arraydelta(g)
+        elif greek == "vega": return BlackScholes.__arrayvega(g)
+        elif greek == "theta": return BlackScholes.__arraytheta(g)
+        elif greek == "rho": return BlackScholes.__arrayrho(g)
+        elif greek == "gamma": return BlackScholes.__arraygamma(g)
+        elif greek == "vanna": return BlackScholes.__arrayvanna(g)
+        elif greek == "volga": return BlackScholes.__arrayvolga(g)
+        elif greek == "charm": return BlackScholes.__arraycharm(g)
+        elif greek == "veta": return BlackScholes.__arrayveta(g)
+        else: raise ValueError("Unsupported greek: " + str(greek))
+
+    ### Vectorized Kernels ###
+
+    """
+
+    every pricing method above also accepts broadcastable numpy arrays (or
+    lists) for any of its arguments, including a mixed array of "C" / "P"
+    types. array calls share the intermediate terms below and return arrays,
+    while pure scalar calls keep the exact scalar code path from above
+
+    unsupported option types evaluate to nan instead of an Error object
+
+    """
+    @staticmethod
+    def isarray(*args):
+
+        for a in args:
+            if isinstance(a, (np.ndarray, list, tuple)): return True
+        return False
+
+    @staticmethod
+    def __terms(typ, S, K, T, r, q, sigma):
+
+        # broadcast everything up front so every greek has the full shape
+        typ, S, K, T, r, q, sigma = np.broadcast_arrays(typ, S, K, T, r, q, sigma)
+        S, K, T = S.astype(float), K.astype(float), T.astype(float)
+        r, q, sigma = r.astype(float), q.astype(float), sigma.astype(float)
+        # +1 for calls, -1 for puts so both share a single formula
+        w = np.where(typ == "C", 1.0, np.where(typ == "P", -1.0, np.nan))
+        # same expiry convention as the scalar greeks (T floored at zero)
+        expired = T <= 0
+        T = np.where(expired, BlackScholes.zero, T)
+        sqrtT = np.sqrt(T)
+        coef = 1 / (sigma * sqrtT)
+        d1 = coef * (np.log(S / K) + (r - q + (sigma ** 2 / 2)) * T)
+        d2 = d1 - (sigma * sqrtT)
+        g = {
+            "w": w, "S": S, "K": K, "T": T, "r": r, "q": q, "sigma": sigma,
+            "expired": expired, "sqrtT": sqrtT, "d1": d1, "d2": d2,
+            "eq": np.exp(-q * T), "er": np.exp(-r * T),
+            # N(d1) / N(d2) for calls, N(-d1) / N(-d2) for puts
+            "Nd1": Normal.cdf(w * d1), "Nd2": Normal.cdf(w * d2),
+            "nd1": Normal.pdf(d1)
+        }
+        return g
+
+    @staticmethod
+    def __arrayprice(g):
+
+        w, S, K = g["w"], g["S"], g["K"]
+        price = w * ((S * g["eq"] * g["Nd1"]) - (K * g["er"] * g["Nd2"]))
+        # expired options are worth their intrinsic value
+        intrinsic = np.maximum(0, w * (S - K))
+        return np.where(g["expired"], intrinsic, price)
+
+    @staticmethod
+    def __arraydelta(g):
+
+        return g["w"] * g["eq"] * g["Nd1"]
+
+    @staticmethod
+    def __arrayvega(g):
+
+        return g["S"] * g["eq"] * g["nd1"] * g["sqrtT"]
+
+    @staticmethod
+    def __arraytheta(g):
+
+        w, S, K, r, q = g["w"], g["S"], g["K"], g["r"], g["q"]
+        T1 = (-g["eq"] * S * g["nd1"] * g["sigma"]) / (2 * g["sqrtT"])
+        C2 = r * K * g["er"]
+        C3 = q * S * g["eq"]
+        return T1 - w * C2 * g["Nd2"] + w * C3 * g["Nd1"]
+
+    @staticmethod
+    def __arrayrho(g):
+
+        return g["w"] * g["K"] * g["T"] * g["er"] * g["Nd2"]
+
+    @staticmethod
+    def __arraygamma(g):
+
+        factor = 1 / (g["S"] * g["sigma"] * g["sqrtT"])
+        return g["eq"] * factor * g["nd1"]
+
+    @staticmethod
+    def __arrayvanna(g):
+
+        return (-g["eq"] * g["nd1"] * g["d2"]) / g["sigma"]
+
+    @staticmethod
+    def __arrayvolga(g):
+
+        factor = (g["sqrtT"] * g["d1"] * g["d2"]) / g["sigma"]
+        return g["S"] * g["eq"] * g["nd1"] * factor
+
+    @staticmethod
+    def __arraycharm(g):
+
+        w, T, sigma, sqrtT = g["w"], g["T"], g["sigma"], g["sqrtT"]
+        num = g["eq"] * g["nd1"] * 2 * (g["r"] - g["q"]) * T - g["d2"] * sigma * sqrtT
+        denom = 2 * T * sigma * sqrtT
+        return w * g["q"] * g["eq"] * g["Nd1"] - num / denom
+
+    @staticmethod
+    def __arrayveta(g):
+
+        r, q, T, d1, d2 = g["r"], g["q"], g["T"], g["d1"], g["d2"]
+        term1 = ((r - q) * d1) / (g["sigma"] * g["sqrtT"])
+        term2 = (1 + d1 * d2) / (2 * T)
+        coeff = q + term1 - term2
+        return -g["S"] * g["eq"] * g["nd1"] * g["sqrtT"] * coeff
     
 class Option(object):
 
-    def __init__(self, typ, side, K, T, r, q, sigma):
+    """
+
+    side: "Long" / "Short", or a signed quantity
+    quantity: number of contracts, scaling the side
+    multiplier: contract multiplier
+
+    """
+
+    def __init__(self, typ, side, K, T, r, q, sigma, quantity = 1, multiplier = 1):
 
         self.typ = typ
         self.side = side
+        self.quantity = quantity
+        self.multiplier = multiplier
         self.K = K
         self.T = T
         self.r = r
         self.q = q
         self.sigma = sigma
         
+class PricingGrid(object):
+
+    """
+
+    labeled result of Pricer.computegrid
+
+    values: array of shape (len(spots), len(vols), len(maturities)), with a
+            vol / maturity axis of length one when the options' own sigma / T
+            were used (and the matching label is None)
+
+    """
+
+    dims = ("spot", "vol", "maturity")
+
+    def __init__(self, greek, values, spots, vols, maturities):
+
+        self.greek = greek
+        self.values = values
+        self.spots = spots
+        self.vols = [None] if vols is None else list(vols)
+        self.maturities = [None] if maturities is None else list(maturities)
+
+    def sel(self, vol = None, maturity = None):
+
+        # the curve over spot for a given vol / maturity label
+        j = self.vols.index(vol)
+        k = self.maturities.index(maturity)
+        return self.values[:, j, k]
+
+    def curves(self):
+
+        # one (spots, values) curve per vol / maturity pair
+        res = []
+        for j in range(len(self.vols)):
+            for k in range(len(self.maturities)):
+                res.append((self.spots, self.values[:, j, k]))
+        return res
+
 class Pricer(object):
 
     """
     
-    strategy: list of option objects
+    strategy: list of option objects, or a Book (see book.py) with the
+              legs stored column wise
 
     """
 
     @staticmethod
-    def plot(strategy, plots = ['payoff', 'price', 'delta'], diffvols = True, diffmats = False):
+    def plot(strategy, plots = ['payoff', 'price', 'delta'], diffvols = True, diffmats = False, spots = None):
         
         # if both modes enabled default to diffmats
         if diffvols and diffmats:
@@ -206,200 +499,156 @@ class Pricer(object):
             vol_titles = ['']
             mat_titles = ['']
 
-        numplots = len(plots)
-
-        f, ax = plt.subplots(numplots)
-        f.set_figheight(8)
-        f.set_figwidth(10)
-
-        for i in range(numplots):
-
-            plottype = plots[i]
-            if plottype == "payoff": data = Pricer.computepayoff(strategy)
-            elif plottype == "price": data = Pricer.computeprice(strategy, vols, maturities)
-            # first order greeks
-            elif plottype == "delta": data = Pricer.computegreek(strategy, vols, maturities, "delta")
-            elif plottype == "vega": data = Pricer.computegreek(strategy, vols, maturities, "vega")
-            elif plottype == "theta": data = Pricer.computegreek(strategy, vols, maturities, "theta")
-            elif plottype == "rho": data = Pricer.computegreek(strategy, vols, maturities, "rho")
-            # second order greeks
-            elif plottype == "gamma": data = Pricer.computegreek(strategy, vols, maturities, "gamma")
-            elif plottype == "vanna": data = Pricer.computegreek(strategy, vols, maturities, "vanna")
-            elif plottype == "volga": data = Pricer.computegreek(strategy, vols, maturities, "volga")
-            elif plottype == "charm": data = Pricer.computegreek(strategy, vols, maturities, "charm")
-            elif plottype == "veta": data = Pricer.computegreek(strategy, vols, maturities, "veta")
-
-            if numplots == 1: 
-                for j in range(len(data)): 
-                    x, y = data[j]
-                    
-                    if plottype == 'payoff': label = plottype
-                    else: 
-                        if diffvols: label = plottype + vol_titles[j]
-                        elif diffmats: label = plottype + mat_titles[j]
-                        else: label = plottype
-                        
-                    ax.plot(x, y, label = label)
-                ax.legend(loc='upper right')
-            else: 
-                for j in range(len(data)): 
-                    x, y = data[j]
-                    
-                    if plottype == 'payoff': label = plottype
-                    else: 
-                        if diffvols: label = plottype + vol_titles[j]
-                        elif diffmats: label = plottype + mat_titles[j]
-                        else: label = plottype
-                        
-                    ax[i].plot(x, y, label = label)
-                ax[i].legend(loc='upper right')
-
-        f.tight_layout(pad=0.5)
-        plt.show()
-
-    @staticmethod
-    def computepayoff(strategy):
-
-        values = []
-        maxspot = 2 * Pricer.__maxstrike(strategy) + 1
-        spots = [ s for s in range(1, maxspot) ]
-
-        for S in spots:
-            value = 0
-            for o in strategy:
-                p = BlackScholes.price(o.typ, S, o.K, 0, o.r, o.q, o.sigma)
-                if o.side == "Long": value += p
-                elif o.side == "Short": value -= p
-            values.append(value)
-
-        return [(spots, values)]
-
-    @staticmethod
-    def computeprice(strategy, vols, maturities):
+        # every requested series comes out of a single fused evaluation
+        series = Pricer.compute(strategy, plots, spots, vols or None, maturities or None)
+        grids = Pricer.__grids(series, plots, vols or None, maturities or None)
 
-        res = []
-        maxspot = 2 * Pricer.__maxstrike(strategy) + 1
-        spots = [ s for s in range(1, maxspot) ]
-
-        # computing price across various vol levels
-        if len(vols) > 0:
-            for vol in vols:
-                values = []
-                for S in spots:
-                    value = 0
-                    for o in strategy:
-                        p = BlackScholes.price(o.typ, S, o.K, o.T, o.r, o.q, vol)
-                        if o.side == "Long": value += p
-                        elif o.side == "Short": value -= p
-                    values.append(value)
-                res.append((spots, values))
-                
-        # computing price across various maturities
-        elif len(maturities) > 0:
-            for mat in maturities:
-                values = []
-                for S in spots:
-                    value = 0
-                    for o in strategy:
-                        p = BlackScholes.price(o.typ, S, o.K, mat, o.r, o.q, o.sigma)
-                        if o.side == "Long": value += p
-                        elif o.side == "Short": value -= p
-                    values.append(value)
-                res.append((spots, values))
-        
-        # computing price across specified vol and maturity
-        else:
-            values = []
-            for S in spots:
-                value = 0
-                for o in strategy:
-                    p = BlackScholes.price(o.typ, S, o.K, o.T, o.r, o.q, o.sigma)
-                    if o.side == "Long": value += p
-                    elif o.side == "Short": value -= p
-                values.append(value)
-            res.append((spots, values))
+        from plotting import Plotting
+        Plotting.strategy(grids, plots, diffvols, diffmats, vol_titles, mat_titles)
 
-        return res
-    
+    """
+
+    full risk report for the strategy at spot S: the signed sum of price and
+    greeks across all legs, evaluated with a single fused kernel call
+
+    """
     @staticmethod
-    def computegreek(strategy, vols, maturities, greek):
+    def computerisk(strategy, S, which = None):
 
-        res = []
-        maxspot = 2 * Pricer.__maxstrike(strategy) + 1
-        spots = [ s for s in range(1, maxspot) ]
+        book = Book.tobook(strategy)
+        legs = BlackScholes.all_greeks(book.typ, S, book.K, book.T, book.r, book.q, book.sigma, which)
+        res = np.zeros((), dtype=legs.dtype)
+        for f in legs.dtype.names: res[f] = np.dot(book.weights, legs[f])
+        return res[()]
+
+    @staticmethod
+    def computepayoff(strategy, spots = None):
+
+        grid = Pricer.computegrid(strategy, "price", spots, maturities = [0])
+        return grid.curves()
+
+    @staticmethod
+    def computeprice(strategy, vols, maturities, spots = None):
+
+        return Pricer.computegreek(strategy, vols, maturities, "price", spots)
+    
+    @staticmethod
+    def computegreek(strategy, vols, maturities, greek, spots = None):
 
         # computing greek across various vol levels
-        if len(vols) > 0:
-            for vol in vols:
-                values = []
-                for S in spots:
-                    value = 0
-                    for o in strategy:
-                        g = Pricer.__getgreek(S, o, vol, o.T, greek)
-                        if o.side == "Long": value += g
-                        elif o.side == "Short": value -= g
-                    values.append(value)
-                res.append((spots, values))
-        
+        if len(vols) > 0: grid = Pricer.computegrid(strategy, greek, spots, vols = vols)
         # computing greek across various maturities
-        elif len(maturities) > 0:
-            for mat in maturities:
-                values = []
-                for S in spots:
-                    value = 0
-                    for o in strategy:
-                        g = Pricer.__getgreek(S, o, o.sigma, mat, greek)
-                        if o.side == "Long": value += g
-                        elif o.side == "Short": value -= g
-                    values.append(value)
-                res.append((spots, values))
-            
+        elif len(maturities) > 0: grid = Pricer.computegrid(strategy, greek, spots, maturities = maturities)
         # computing greek across specified vol and maturity
-        else:
-            values = []
-            for S in spots:
-                value = 0
-                for o in strategy:
-                    g = Pricer.__getgreek(S, o, o.sigma, o.T, greek)
-                    if o.side == "Long": value += g
-                    elif o.side == "Short": value -= g
-                values.append(value)
-            res.append((spots, values))
+        else: grid = Pricer.computegrid(strategy, greek, spots)
+
+        return grid.curves()
+
+    """
+
+    grid engine: evaluates the whole strategy over the spot x vol x maturity
+    cartesian grid as one broadcast computation, then reduces the leg axis
+    with the signed position weights (quantity * multiplier)
+
+    spots: defaults to 1 ... 2 * maxstrike, see adaptivespots for a strike
+           aware grid with far fewer points
+    vols: list of vols, or None to use each option's own sigma
+    maturities: list of maturities, or None to use each option's own T
+
+    the grid is evaluated in blocks of spots so that no intermediate holds
+    more than Pricer.blocksize elements
+
+    """
+
+    blocksize = 1000000
+
+    @staticmethod
+    def computegrid(strategy, greek, spots = None, vols = None, maturities = None):
+
+        res = Pricer.compute(strategy, [greek], spots, vols, maturities)
+        return PricingGrid(greek, res[greek], res["spots"], vols, maturities)
+
+    """
+
+    computes the union of the requested series (payoff, price and any of
+    the greeks) in one fused pass over the grid, without touching matplotlib
 
+    returns a dict with the "spots" used plus one array per series of shape
+    (len(spots), len(vols), len(maturities)), see PricingGrid. the payoff
+    does not depend on vol or maturity and has shape (len(spots), 1, 1)
+
+    ex. Pricer.compute(strategy, ['price', 'delta', 'gamma'], vols = [0.1, 0.2])
+
+    """
+    @staticmethod
+    def compute(strategy, series = ['price'], spots = None, vols = None, maturities = None):
+
+        strategy = Book.tobook(strategy)
+        if spots is None: spots = Pricer.__spots(strategy)
+        spots = np.asarray(spots, dtype=float)
+        res = {"spots": spots}
+        # the payoff is simply the strategy value at expiry
+        if "payoff" in series:
+            res["payoff"] = Pricer.__evaluate(strategy, ["price"], spots, None, [0])["price"]
+        greeks = [ s for s in dict.fromkeys(series) if s != "payoff" ]
+        if len(greeks) > 0:
+            res.update(Pricer.__evaluate(strategy, greeks, spots, vols, maturities))
         return res
-    
+
     @staticmethod
-    def __getgreek(S, o, vol, maturity, greek):
-
-        g = 0
-        if greek == "delta":
-            g = BlackScholes.delta(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "vega":
-            g = BlackScholes.vega(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "theta":
-            g = BlackScholes.theta(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "rho":
-            g = BlackScholes.rho(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "gamma":
-            g = BlackScholes.gamma(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "vanna":
-            g = BlackScholes.vanna(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "volga":
-            g = BlackScholes.volga(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "charm":
-            g = BlackScholes.charm(o.typ, S, o.K, maturity, o.r, o.q, vol)
-        elif greek == "veta":
-            g = BlackScholes.veta(o.typ, S, o.K, maturity, o.r, o.q, vol)
+    def __evaluate(strategy, greeks, spots, vols, maturities):
+
+        legs = Book.tobook(strategy)
+        weights = legs.weights
+        # vol and maturity axes, each either a grid axis or the legs' own values
+        if vols is None: sigma = legs.sigma[None, None, None, :]
+        else: sigma = np.asarray(vols, dtype=float)[None, :, None, None]
+        if maturities is None: T = legs.T[None, None, None, :]
+        else: T = np.asarray(maturities, dtype=float)[None, None, :, None]
+        typ, K, r, q = legs.typ, legs.K, legs.r, legs.q
+        numvols = 1 if vols is None else len(vols)
+        nummats = 1 if maturities is None else len(maturities)
+        res = {}
+        for greek in greeks: res[greek] = np.empty((len(spots), numvols, nummats))
+        step = max(1, Pricer.blocksize // max(1, numvols * nummats * len(weights)))
+        for i in range(0, len(spots), step):
+            S = spots[i:i + step, None, None, None]
+            g = BlackScholes.all_greeks(typ, S, K, T, r, q, sigma, greeks)
+            for greek in greeks: res[greek][i:i + step] = g[greek] @ weights
 
-        return g
+        return res
+
+    @staticmethod
+    def __grids(series, plots, vols, maturities):
+
+        grids = {}
+        for p in plots:
+            if p == "payoff": grids[p] = PricingGrid(p, series[p], series["spots"], None, [0])
+            else: grids[p] = PricingGrid(p, series[p], series["spots"], vols, maturities)
+        return grids
+
+    """
+
+    adaptive spot grid for the strategy (see SpotGrid.adaptive), clustered
+    around the strikes and refined where the chosen greek curves the most.
+    the result can be passed as spots to any of the compute functions above
+
+    ex. spots = Pricer.adaptivespots(strategy, "gamma", tol = 0.001)
+        Pricer.plot(strategy, ['price', 'gamma'], spots = spots)
+
+    """
+    @staticmethod
+    def adaptivespots(strategy, greek = "price", vols = None, maturities = None, tol = 0.001, maxpoints = 256):
+
+        legs = Book.tobook(strategy)
+        widths = legs.sigma * np.sqrt(np.maximum(legs.T, BlackScholes.zero))
+        f = lambda spots: Pricer.compute(legs, [greek], spots, vols, maturities)[greek]
+        return SpotGrid.adaptive(f, legs.K, widths, tol = tol, maxpoints = maxpoints)
 
     @staticmethod
-    def __maxstrike(strategy):
+    def __spots(strategy):
 
-        maxstrike = -1
-        for option in strategy:
-            if option.K >= maxstrike: maxstrike = option.K
-        return maxstrike
+        return SpotGrid.uniform([ Book.tobook(strategy).K.max() ])
     
 if __name__ == "__main__":
 
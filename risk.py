@@ -3,6 +3,7 @@
 from stockmodel import *
 from blackscholes import *
 from hedging import *
+from plotting import Plotting
 
 class Risk(object):
 
@@ -26,12 +27,9 @@ class Risk(object):
         T1, T2, T3 = 2, 2, 2
         V1, V2, V3 = OptionModel.CALL, OptionModel.CALL, OptionModel.CALL
 
-        f, ax = plt.subplots(3, 2)
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
-        ax[0, 0].set_title("Stock Price")
-        ax[0, 0].plot(t, st)
         # now build our options models
         om1 = OptionModel(V1, K1, T1, r, vol, stock, timestep)
         om2 = OptionModel(V2, K2, T2, r, vol, stock, timestep)
@@ -39,23 +37,11 @@ class Risk(object):
         # model the portfolio
         pm = OptionsPortfolio([(om1, "LONG")])
         pm.model(t, st)
-        # plot the delta
-        ax[0, 1].set_title("Delta")
-        ax[0, 1].plot(pm.t, pm.delta)
-        # plot the gamma
-        ax[1, 0].set_title("Gamma")
-        ax[1, 0].plot(pm.t, pm.gamma)
-        # plot the vega
-        ax[1, 1].set_title("Vega")
-        ax[1, 1].plot(pm.t, pm.vega)
-        # plot the theta
-        ax[2, 0].set_title("Theta")
-        ax[2, 0].plot(pm.t, pm.theta)
-        # plot the rho
-        ax[2, 1].set_title("Rho")
-        ax[2, 1].plot(pm.t, pm.rho)
-        f.tight_layout(pad=0.25)
-        plt.show()
+        # plot the stock and the greeks
+        Plotting.panels([("Stock Price", [(t, st)]),
+                         ("Delta", [(pm.t, pm.delta)]), ("Gamma", [(pm.t, pm.gamma)]),
+                         ("Vega", [(pm.t, pm.vega)]), ("Theta", [(pm.t, pm.theta)]),
+                         ("Rho", [(pm.t, pm.rho)])], 3, 2)
 
     """
     
@@ -131,12 +117,9 @@ class Risk(object):
         T1, T2, T3, T4, T5 = 0.25, 0.5, 0.75, 1, 2
         V1, V2, V3, V4, V5 = OptionModel.CALL, OptionModel.CALL, OptionModel.CALL, OptionModel.CALL, OptionModel.CALL
 
-        f, ax = plt.subplots(2)
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
-        ax[0].set_title("Stock Price")
-        ax[0].plot(t, st)
         # now build our options models
         om1 = OptionModel(V1, K1, T1, r, vol, stock, timestep)
         om2 = OptionModel(V2, K2, T2, r, vol, stock, timestep)
@@ -146,14 +129,9 @@ class Risk(object):
         options = [om1, om2, om3, om4, om5]
         # model the options
         for o in options: o.model(t, st)
-        # plot the greek
-        ax[1].set_title(greek)
-        for o in options: 
-            if greek == "Delta": g = o.delta
-            elif greek == "Gamma": g = o.gamma
-            ax[1].plot(o.t, g)
-        f.tight_layout(pad=0.25)
-        plt.show()
+        # plot the stock and the greek
+        lines = [ (o.t, getattr(o, greek.lower())) for o in options ]
+        Plotting.panels([("Stock Price", [(t, st)]), (greek, lines)])
 
     """
     
@@ -201,12 +179,9 @@ class Risk(object):
         T1, T2, T3, T4, T5 = 2, 2, 2, 2, 2
         V1, V2, V3, V4, V5 = OptionModel.CALL, OptionModel.CALL, OptionModel.CALL, OptionModel.CALL, OptionModel.CALL
 
-        f, ax = plt.subplots(2)
         stock = StockModel(N, S0, r, vol, timestep)
         # first model the underlying
         (t, st) = stock.model()
-        ax[0].set_title("Stock Price")
-        ax[0].plot(t, st)
         # now build our options models
         om1 = OptionModel(V1, K1, T1, r, vol, stock, timestep)
         om2 = OptionModel(V2, K2, T2, r, vol, stock, timestep)
@@ -216,15 +191,9 @@ class Risk(object):
         options = [om1, om2, om3, om4, om5]
         # model the options
         for o in options: o.model(t, st)
-        # plot the greek
-        ax[1].set_title(greek)
-        for o in options: 
-            if greek == "Delta": g = o.delta
-            elif greek == "Gamma": g = o.gamma
-            ax[1].plot(o.t, g, label = "Strike: " + str(o.K))
-        f.tight_layout(pad=0.25)
-        plt.legend()
-        plt.show()
+        # plot the stock and the greek, one line per strike
+        lines = [ (o.t, getattr(o, greek.lower()), "Strike: " + str(o.K)) for o in options ]
+        Plotting.panels([("Stock Price", [(t, st)]), (greek, lines)])
 
 if __name__ == "__main__":
 
@@ -0,0 +1,87 @@
+# lmarolda - spot grids
+
+import numpy as np
+
+class SpotGrid(object):
+
+    """
+
+    spot grids for plotting / evaluating option structures over spot
+
+    the uniform grid 1, 2, ..., 2 * maxstrike wastes points on the flat tails
+    of large strikes and is far too coarse for small strikes. the adaptive
+    grid instead seeds points around each strike and then keeps bisecting
+    the intervals where the curve is not well approximated by a straight
+    line, ie. where the selected greek has high curvature
+
+    """
+
+    @staticmethod
+    def uniform(strikes):
+
+        maxspot = 2 * max(strikes) + 1
+        return np.arange(1, maxspot)
+
+    """
+
+    f: vectorized evaluator, f(spots) returns an array whose first axis is
+       spot (any further axes, eg. several vols, are treated as more curves)
+    strikes: strikes of the structure, points are clustered around them
+    widths: relative width of the cluster around each strike, typically
+            sigma * sqrt(T) of the option (defaults to 0.1)
+    lo, hi: spot range, defaults to [min(1, minstrike / 2), 2 * maxstrike]
+    tol: target error of linear interpolation, relative to the range of the
+         curve values
+    maxpoints: point budget, the grid never exceeds this many spots
+
+    each refinement round evaluates all new midpoints in a single call to f
+
+    """
+    @staticmethod
+    def adaptive(f, strikes, widths = None, lo = None, hi = None, tol = 0.001, maxpoints = 256):
+
+        strikes = np.atleast_1d(np.asarray(strikes, dtype=float))
+        if widths is None: widths = np.full(len(strikes), 0.1)
+        widths = np.broadcast_to(np.asarray(widths, dtype=float), strikes.shape)
+        if lo is None: lo = min(1, strikes.min() / 2)
+        if hi is None: hi = 2 * strikes.max()
+        # seed: a coarse uniform grid plus a cluster of points around each strike
+        z = np.linspace(-2, 2, 9)
+        clusters = strikes[:, None] * np.exp(widths[:, None] * z[None, :])
+        seed = np.concatenate((np.linspace(lo, hi, 17), strikes, clusters.ravel()))
+        seed = np.unique(seed[(seed >= lo) & (seed <= hi)])
+        if len(seed) > maxpoints:
+            seed = seed[np.unique(np.linspace(0, len(seed) - 1, maxpoints).astype(int))]
+        spots = seed
+        values = SpotGrid.__curves(f, spots)
+
+        # every interval starts out as a candidate for refinement
+        candidates = np.arange(len(spots) - 1)
+        while len(candidates) > 0 and len(spots) < maxpoints:
+            # error of every candidate at its midpoint, then bisect the worst
+            # first, capped by the remaining budget
+            mids = (spots[candidates] + spots[candidates + 1]) / 2
+            midvalues = SpotGrid.__curves(f, mids)
+            linear = (values[candidates] + values[candidates + 1]) / 2
+            errors = np.max(np.abs(midvalues - linear), axis=1)
+            worst = np.argsort(-errors, kind="stable")[:maxpoints - len(spots)]
+            (mids, midvalues, errors) = (mids[worst], midvalues[worst], errors[worst])
+            span = np.ptp(values, axis=0).max()
+            bad = errors > tol * (span if span > 0 else 1)
+            # insert the midpoints, keeping the spots sorted
+            order = np.argsort(np.concatenate((spots, mids)), kind="stable")
+            spots = np.concatenate((spots, mids))[order]
+            values = np.concatenate((values, midvalues))[order]
+            # both halves of each badly approximated interval are refined next
+            position = np.empty(len(order), dtype=int)
+            position[order] = np.arange(len(order))
+            newmids = position[len(order) - len(mids):][bad]
+            candidates = np.column_stack((newmids - 1, newmids)).ravel()
+
+        return spots
+
+    @staticmethod
+    def __curves(f, spots):
+
+        values = np.asarray(f(spots), dtype=float)
+        return values.reshape(len(spots), -1)
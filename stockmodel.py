@@ -1,10 +1,7 @@
 # first attempt at stock model (GBM)
 
-import matplotlib.pyplot as plt
-from mpl_toolkits import mplot3d
 import numpy as np
 import math as m
-from scipy.stats import bernoulli
 
 class BrownianMotion(object):
 
@@ -19,13 +16,14 @@ class BrownianMotion(object):
     @staticmethod
     def plotInstances(num, iterations):
 
+        from plotting import Plotting
         bm = BrownianMotion()
-        ax = plt.axes()
+        data = []
         for i in range(num): 
             bm.simulate(iterations)
-            ax.plot(bm.t, bm.wt)
+            data.append((list(bm.t), list(bm.wt)))
             bm.clear()
-        plt.show()
+        Plotting.lines(data)
 
     def iterate(self):
 
@@ -45,12 +43,13 @@ class BrownianMotion(object):
 
     def plotBM(self):
 
-        ax = plt.axes()
-        ax.plot(self.t, self.wt)
-        plt.show()
+        from plotting import Plotting
+        Plotting.lines([(self.t, self.wt)])
 
     def __generatestep(self):
 
+        # scipy.stats is slow to import, so only load it once we simulate
+        from scipy.stats import bernoulli
         r = bernoulli.rvs(self.p)
         step = self.size if r == 1 else -self.size
         # determine next elem to add to list
@@ -67,6 +66,11 @@ sigma: volatility parameter
 """
 class StockModel(object):
 
+    # values per block of rows in modelpaths
+    blocksize = 1 << 18
+    # paths per random stream of pathblocks
+    streampaths = 1024
+
     def __init__(self, N, s0, drift, vol, timestep = 0.001):
 
         self.N = N
@@ -81,12 +85,13 @@ class StockModel(object):
     @staticmethod
     def plotstock(num, iterations, s0, drift, vol, timestep):
 
-        ax = plt.axes()
+        from plotting import Plotting
+        data = []
         for i in range(num): 
             s = StockModel(iterations, s0, drift, vol, timestep)
             s.simulate(iterations)
-            ax.plot(s.t, s.st)
-        plt.show()
+            data.append((s.t, s.st))
+        Plotting.lines(data)
 
     @staticmethod
     def normalize(n, returnrate, volatility):
@@ -100,6 +105,140 @@ class StockModel(object):
         self.simulate(self.N)
         return (self.t, self.st)
 
+    """
+
+    vectorized counterpart of model(): M independent paths over the same
+    horizon in one shot, returned as arrays (t, st) with t of shape
+    (steps + 1,) and st of shape (M, steps + 1), so st[i] is laid out like
+    the st of model() (st[:, 0] = s0, t[0] = 0)
+
+    scheme "exact" draws the exact lognormal increments
+    ln(S(t + dt) / S(t)) = (alpha - sigma^2 / 2) * dt + sigma * sqrt(dt) * Z
+    and "bernoulli" reproduces the scheme of simulate(), a +-sqrt(dt) random
+    walk for the brownian motion (same distribution, not the same draws)
+
+    rng: numpy Generator or seed, dtype: float64, or float32 to halve memory
+
+    paths are built a block of rows at a time in one reused buffer (draw,
+    cumulative sum of the log increments, exp into st), which keeps the
+    working set in cache. the exact scheme is bound by the normal draws
+
+    """
+    def modelpaths(self, M, rng = None, scheme = "exact", dtype = np.float64):
+
+        if scheme not in ("exact", "bernoulli"): raise ValueError("Unknown path scheme " + str(scheme))
+        rng = np.random.default_rng(rng)
+        steps = m.floor(self.N / self.timestep)
+        t = self.timestep * np.arange(steps + 1)
+        st = np.empty((M, steps + 1), dtype=dtype)
+        st[:, 0] = self.s0
+        if steps == 0 or M == 0: return (t, st)
+        rows = max(1, StockModel.blocksize // steps)
+        buffer = np.empty((min(rows, M), steps), dtype=dtype)
+        for start in range(0, M, rows):
+            z = buffer[:min(rows, M - start)]
+            self.__increments(rng, z, scheme)
+            self.__prices(z, st[start:start + len(z), 1:])
+        return (t, st)
+
+    """
+
+    streaming counterpart of modelpaths for more paths than fit in memory:
+    yields the M paths as consecutive blocks (t, st), st of shape
+    (paths, steps + 1) (the last block may be shorter), so pricers, hedgers
+    and reducers fold over the blocks with memory bounded by one block
+
+    the random stream does not depend on the blocks: path i is row
+    i % streampaths of the stream i // streampaths, each stream being
+    spawned from seed as SeedSequence(seed).spawn(...)[i // streampaths],
+    and streams fill their rows in order. any block size therefore yields
+    exactly the same paths, and any range of paths can be regenerated on
+    its own (a block aligned to streampaths draws nothing it drops)
+
+    seed: int, or None for fresh entropy shared by all the blocks
+    first: first path, ie. yields paths first .. M - 1 only, as in a run
+           from 0 (ex. the share of one worker)
+    matching: moment matching of the exact scheme, the normals of every
+              step are shifted and scaled to mean 0 and variance 1 across
+              the paths of each stream (so a stream is drawn whole, and its
+              paths are no longer independent of one another)
+
+    """
+    def pathblocks(self, M, paths = 65536, seed = None, scheme = "exact", dtype = np.float64, first = 0,
+                   matching = False):
+
+        if scheme not in ("exact", "bernoulli"): raise ValueError("Unknown path scheme " + str(scheme))
+        steps = m.floor(self.N / self.timestep)
+        t = self.timestep * np.arange(steps + 1)
+        entropy = np.random.SeedSequence(seed).entropy
+        chunk = StockModel.streampaths
+        for start in range(first, M, paths):
+            stop = min(start + paths, M)
+            st = np.empty((stop - start, steps + 1), dtype=dtype)
+            st[:, 0] = self.s0
+            # the streams overlapping the block, drawn up to its last row
+            for stream in range(start // chunk, (stop - 1) // chunk + 1 if steps > 0 else 0):
+                row = stream * chunk
+                (lo, hi) = (max(start, row), min(stop, row + chunk))
+                rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(stream,)))
+                z = np.empty((min(row + chunk, M) - row if matching else hi - row, steps), dtype=dtype)
+                self.__increments(rng, z, scheme, matching)
+                self.__prices(z[lo - row:hi - row], st[lo - start:hi - start, 1:])
+            yield (t, st)
+
+    """
+
+    antithetic paths of the blocks (t, st) of modelpaths / pathblocks, ie.
+    the paths of the mirrored brownian motion -W. every log increment
+    becomes 2 * drift - increment, so
+    mirror = (s0 * exp((alpha - sigma^2 / 2) * t))^2 / st
+    (for the bernoulli scheme, the mirror only has the same law when p = 0.5)
+
+    """
+    def mirror(self, t, st):
+
+        centre = self.s0 * np.exp((self.alpha - self.sigma ** 2 / 2) * np.asarray(t))
+        return (centre * centre / st).astype(st.dtype, copy=False)
+
+    def __increments(self, rng, z, scheme, matching = False):
+
+        # log price increments of every step, filled in place row by row
+        drift = (self.alpha - self.sigma ** 2 / 2) * self.timestep
+        scale = self.sigma * self.bm.size
+        if scheme == "exact":
+            rng.standard_normal(out=z, dtype=z.dtype)
+            if matching and len(z) > 1:
+                z -= z.mean(axis=0)
+                z /= z.std(axis=0)
+            z *= scale
+            z += drift
+            return
+        # down and up steps of the walk
+        walk = np.array([drift - scale, drift + scale], dtype=z.dtype)
+        if self.bm.p == 0.5:
+            # fair coin flips straight from random bits
+            bits = np.unpackbits(rng.integers(0, 256, (z.size + 7) // 8, dtype=np.uint8), count=z.size)
+            np.take(walk, bits.reshape(z.shape), out=z)
+        else:
+            np.take(walk, (rng.random(z.shape) < self.bm.p).view(np.uint8), out=z)
+
+    def __prices(self, z, out):
+
+        # log prices, then prices, written straight into the paths
+        z[:, 0] += m.log(self.s0)
+        np.cumsum(z, axis=1, out=z)
+        np.exp(z, out=out)
+
+    """
+
+    M paths of a StockModel(N, s0, drift, vol, timestep), see modelpaths
+
+    """
+    @staticmethod
+    def paths(M, N, s0, drift, vol, timestep = 0.001, rng = None, scheme = "exact", dtype = np.float64):
+
+        return StockModel(N, s0, drift, vol, timestep).modelpaths(M, rng, scheme, dtype)
+
     def simulate(self, totaltime):
 
         steps = m.floor(totaltime / self.timestep)
@@ -131,6 +270,58 @@ class StockModel(object):
 
 """
 
+running mean / variance of a stream of samples, ex. the discounted payoffs
+of path blocks: add folds in a block, merge combines two accumulators
+(chan et al. pairwise update), so memory stays O(1) whatever the number of
+samples
+
+samples may also be vectors, added as (n, d) blocks, in which case mean
+is a vector and variance the covariance matrix
+
+"""
+class Moments(object):
+
+    def __init__(self):
+
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values):
+
+        values = np.asarray(values, dtype=float)
+        if values.ndim != 2: values = values.ravel()
+        if len(values) == 0: return self
+        block = Moments()
+        block.n = len(values)
+        block.mean = values.mean(axis=0)
+        deviations = values - block.mean
+        block.m2 = deviations.T @ deviations if values.ndim == 2 else float(deviations @ deviations)
+        if values.ndim != 2: block.mean = float(block.mean)
+        return self.merge(block)
+
+    def merge(self, other):
+
+        n = self.n + other.n
+        if n == 0: return self
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / n
+        self.m2 = self.m2 + other.m2 + np.multiply.outer(delta, delta) * self.n * other.n / n
+        self.n = n
+        return self
+
+    @property
+    def variance(self): return self.m2 / (self.n - 1) if self.n > 1 else float("nan")
+
+    @property
+    def stderr(self):
+
+        if self.n < 2: return float("nan")
+        if np.ndim(self.mean) > 0: return np.sqrt(np.diagonal(self.variance) / self.n)
+        return m.sqrt(self.variance / self.n)
+
+"""
+
 obtain annualized data for the following:
 mean return rate
 expected volatility (implied, historical, etc.)
@@ -158,4 +349,17 @@ if __name__ == "__main__":
     (t, st) = stock.model()
     """
 
+    """
+    # 1m paths as blocks of 65536, folding the payoff of a call struck at S0
+    moments = Moments()
+    for (t, st) in StockModel(N, S0, A, S, timestep).pathblocks(1000000, seed = 0):
+        moments.add(np.maximum(st[:, -1] - S0, 0))
+    print(moments.mean * m.exp(-A), moments.stderr)
+    """
+
+    """
+    # 100k paths at once, st of shape (100000, steps + 1)
+    (t, st) = StockModel.paths(100000, N, S0, A, S, timestep, rng = 0)
+    """
+
     StockModel.plotstock(I, N, S0, A, S, timestep)
\ No newline at end of file
@@ -0,0 +1,249 @@
+# lmarolda - implied volatility surface
+
+import numpy as np
+from svi import SVI
+
+class VolSurface(object):
+
+    """
+
+    implied vol surface of one underlying, gridded by log moneyness
+    k = ln(K / F(T)) and time to expiry
+
+    the fitted surface is a table of total implied variance w = sigma^2 T on
+    a uniform k grid, one row per quoted expiry, plus the natural cubic spline
+    second derivatives of every row. a query vol(K, T)
+    - finds k from the forward, interpolated linearly in ln(F / S) over T
+    - evaluates the spline of the two expiries around T at k, in O(1) as
+      the grid is uniform (flat beyond the quoted strikes)
+    - interpolates linearly in total variance across time, ie. constant
+      vol before the first expiry and constant vol after the last
+
+    so millions of lookups are a handful of vectorized gathers, and building
+    (which goes through the quotes once) can be slow without it mattering
+
+    symbol, spot: the underlying
+    T: expiries (years, increasing), forwards: forward of each expiry
+    k: uniform log moneyness grid, w: total variance, shape (len(T), len(k))
+
+    """
+
+    def __init__(self, symbol, spot, T, forwards, k, w):
+
+        self.symbol = symbol
+        self.spot = float(spot)
+        self.T = np.asarray(T, dtype=float)
+        self.forwards = np.asarray(forwards, dtype=float)
+        self.k = np.asarray(k, dtype=float)
+        self.w = np.maximum(np.asarray(w, dtype=float).reshape(len(self.T), len(self.k)), 0)
+        self.dk = self.k[1] - self.k[0] if len(self.k) > 1 else 1.0
+        self.carry = np.log(self.forwards / self.spot)
+        # second derivatives of the spline through every expiry's row
+        self.M = VolSurface.spline(self.k, self.w.T).T
+        # fingerprint of the quotes the surface was built from, see save
+        self.fingerprint = None
+        # raw svi slice of every expiry (nan rows are splines), and the ssvi
+        # (rho, eta, gamma) of the surface, when fitted with a smile model
+        self.params = None
+        self.ssvi = None
+
+    """
+
+    builds the surface from per quote implied vols (already inverted), with
+    T, forwards, K, sigma broadcastable arrays. nan vols are ignored
+
+    each expiry's smile is the natural cubic spline through its quotes in
+    total variance over k (out of the money quotes when typ is given, the
+    average where several share a strike), resampled on nk points spanning
+    all quoted log moneyness
+
+    params optionally holds a raw svi slice (see svi.SVI) for every expiry of
+    VolSurface.select, in increasing T: those rows are sampled from the svi
+    smile instead, over the whole grid. nan rows keep the spline
+
+    """
+    @staticmethod
+    def fromquotes(symbol, spot, T, forwards, K, sigma, typ = None, nk = 101, params = None):
+
+        T, forwards, K, sigma = [ a.ravel() for a in np.broadcast_arrays(T, forwards, K, sigma) ]
+        k = np.log(K / forwards)
+        valid = VolSurface.select(T, forwards, K, sigma, typ)
+        expiries = np.unique(T[valid])
+        if len(expiries) == 0: raise ValueError("No valid quotes for the surface of " + str(symbol))
+        (lo, hi) = (k[valid].min(), k[valid].max())
+        if hi - lo < 1e-8: (lo, hi) = (lo - 0.1, hi + 0.1)
+        grid = np.linspace(lo, hi, nk)
+        if params is not None: params = np.asarray(params, dtype=float).reshape(len(expiries), SVI.nparams)
+
+        w = np.empty((len(expiries), nk))
+        F = np.empty(len(expiries))
+        for j, t in enumerate(expiries):
+            rows = valid & (T == t)
+            F[j] = forwards[rows][0]
+            if params is not None and not np.isnan(params[j]).any():
+                w[j] = SVI.totalvariance(params[j], grid)
+                continue
+            # average total variance of quotes sharing a strike
+            (x, inverse) = np.unique(k[rows], return_inverse = True)
+            y = np.bincount(inverse.ravel(), sigma[rows] ** 2 * t) / np.bincount(inverse.ravel())
+            if len(x) == 1:
+                w[j] = y[0]
+                continue
+            M = VolSurface.spline(x, y)
+            w[j] = VolSurface.evaluate(x, y, M, np.clip(grid, x[0], x[-1]))
+        surface = VolSurface(symbol, spot, expiries, F, grid, w)
+        surface.params = params
+        return surface
+
+    """
+
+    mask of the quotes a surface is built from: converged vols of unexpired
+    options, and only the out of the money ones of an expiry when typ is
+    given and both wings have some
+
+    """
+    @staticmethod
+    def select(T, forwards, K, sigma, typ = None):
+
+        T, forwards, K, sigma = [ a.ravel() for a in np.broadcast_arrays(T, forwards, K, sigma) ]
+        valid = ~np.isnan(sigma) & (T > 0) & (sigma > 0)
+        if typ is not None:
+            typ = np.broadcast_to(typ, T.shape).ravel()
+            otm = np.where(typ == "C", K >= forwards, K < forwards)
+            for t in np.unique(T[valid]):
+                rows = valid & (T == t)
+                if (rows & otm & (typ == "C")).any() and (rows & otm & (typ == "P")).any(): valid &= ~rows | otm
+        return valid
+
+    """
+
+    implied vol at strikes K and expiries T (broadcastable arrays)
+
+    """
+    def vol(self, K, T):
+
+        (w, rate) = self.__variance(K, T)
+        sigma = np.sqrt(rate)
+        return sigma if sigma.ndim > 0 else float(sigma)
+
+    """
+
+    total implied variance sigma^2 T at strikes K and expiries T
+
+    """
+    def totalvariance(self, K, T):
+
+        (w, rate) = self.__variance(K, T)
+        return w if w.ndim > 0 else float(w)
+
+    def __variance(self, K, T):
+
+        # total variance w and variance rate w / T
+        K, T = np.broadcast_arrays(np.asarray(K, dtype=float), np.asarray(T, dtype=float))
+        k = self.__logmoneyness(K, T)
+        n = len(self.T)
+        j = np.searchsorted(self.T, T)
+        below, above = np.maximum(j - 1, 0), np.minimum(j, n - 1)
+        lower = self.__smile(below, k)
+        upper = lower if n == 1 else self.__smile(above, k)
+        T0, T1 = self.T[below], self.T[above]
+        # linear in total variance between expiries, constant vol outside
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.clip((T - T0) / (T1 - T0), 0, 1)
+            inside = (1 - a) * lower + a * upper
+            rate = np.where(j == 0, upper / T0, np.where(j == n, lower / T0, inside / T))
+        w = np.where((j == 0) | (j == n), rate * T, inside)
+        return (w, rate)
+
+    def __logmoneyness(self, K, T):
+
+        # ln(F / S) is linear in T between expiries, from 0 at T = 0, and
+        # keeps the carry rate of the last expiry beyond it
+        carry = np.interp(T, np.append(0, self.T), np.append(0, self.carry))
+        carry = np.where(T > self.T[-1], self.carry[-1] * T / self.T[-1], carry)
+        return np.log(K / self.spot) - carry
+
+    def __smile(self, rows, k):
+
+        # natural cubic spline of the uniform grid, flat outside it
+        nk = len(self.k)
+        if nk == 1: return self.w[rows, 0] + 0 * k
+        x = np.clip((k - self.k[0]) / self.dk, 0, nk - 1)
+        i = np.minimum(x.astype(np.intp), nk - 2)
+        t = x - i
+        s = 1 - t
+        # flat gathers from the raveled (expiry, k) tables
+        i += rows * nk
+        w, M = self.w.ravel(), self.M.ravel()
+        return (s * w.take(i) + t * w.take(i + 1)
+                + self.dk * self.dk / 6 * ((s * s - 1) * s * M.take(i) + (t * t - 1) * t * M.take(i + 1)))
+
+    """
+
+    natural cubic spline through (x, y), x increasing, y of shape (n, ...)
+    returns the second derivatives M at the knots (M = 0 at both ends)
+
+    """
+    @staticmethod
+    def spline(x, y):
+
+        y = np.asarray(y, dtype=float)
+        n = len(x)
+        M = np.zeros(y.shape)
+        if n < 3: return M
+        h = np.diff(x)
+        slopes = np.diff(y, axis=0) / h.reshape((-1,) + (1,) * (y.ndim - 1))
+        # tridiagonal system of the interior knots
+        A = np.diag(2 * (h[:-1] + h[1:])) + np.diag(h[1:-1], 1) + np.diag(h[1:-1], -1)
+        M[1:-1] = np.linalg.solve(A, 6 * np.diff(slopes, axis=0))
+        return M
+
+    @staticmethod
+    def evaluate(x, y, M, xq):
+
+        i = np.clip(np.searchsorted(x, xq) - 1, 0, len(x) - 2)
+        h = x[i + 1] - x[i]
+        t = (xq - x[i]) / h
+        s = 1 - t
+        return s * y[i] + t * y[i + 1] + h * h / 6 * ((s ** 3 - s) * M[i] + (t ** 3 - t) * M[i + 1])
+
+    ### Disk cache ###
+
+    def save(self, path):
+
+        # empty arrays stand for no smile model
+        params = np.empty((0, SVI.nparams)) if self.params is None else self.params
+        ssvi = np.empty(0) if self.ssvi is None else self.ssvi
+        np.savez(path, symbol = np.array(self.symbol), spot = self.spot, T = self.T, forwards = self.forwards,
+                 k = self.k, w = self.w, fingerprint = np.array(self.fingerprint or ""), params = params, ssvi = ssvi)
+
+    @staticmethod
+    def load(path):
+
+        with np.load(path, allow_pickle = False) as data:
+            surface = VolSurface(str(data["symbol"]), float(data["spot"]), data["T"], data["forwards"], data["k"], data["w"])
+            surface.fingerprint = str(data["fingerprint"]) or None
+            if "params" in data.files and len(data["params"]) > 0: surface.params = data["params"]
+            if "ssvi" in data.files and len(data["ssvi"]) > 0: surface.ssvi = data["ssvi"]
+        return surface
+
+if __name__ == "__main__":
+
+    import time
+    from volatility import ImpliedVolatility
+
+    surfaces = ImpliedVolatility.volatilitysurface("data/stock-options-volume-leaders-06-08-2023.csv")
+    surface = surfaces["TSLA"]
+    print("Symbols: ", len(surfaces), " TSLA expiries (days): ", np.round(surface.T * 365).astype(int))
+    for T in (7 / 365, 30 / 365, 0.5):
+        print("T = %.3f" % T, np.round(surface.vol([200, 220, 235, 250, 270], T), 4))
+    K = np.random.uniform(150, 320, 1000000)
+    T = np.random.uniform(0, 1.5, 1000000)
+    start = time.perf_counter()
+    surface.vol(K, T)
+    print("1e6 lookups: %.3fs" % (time.perf_counter() - start))
+    for model in ("svi", "ssvi"):
+        start = time.perf_counter()
+        fitted = ImpliedVolatility.volatilitysurface("data/stock-options-volume-leaders-06-08-2023.csv", model = model)
+        print(model, "surfaces: %.3fs" % (time.perf_counter() - start), "TSLA 30 days:",
+              np.round(fitted["TSLA"].vol([200, 220, 235, 250, 270], 30 / 365), 4))
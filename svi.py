@@ -0,0 +1,326 @@
+# lmarolda - svi / ssvi smile calibration
+
+import numpy as np
+
+class SVI(object):
+
+    """
+
+    raw svi parametrization of one expiry's smile (gatheral 2004), in total
+    implied variance over log moneyness k = ln(K / F)
+
+    w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2))
+
+    params are rows (a, b, rho, m, sigma), with b >= 0, |rho| < 1, sigma > 0
+
+    fit calibrates many expiries at once: the quotes are padded into a
+    (expiries x points) matrix and a single levenberg marquardt iteration
+    runs over all of them, with vectorized residuals and analytic jacobians
+    and one batched 5 x 5 solve per step. b, rho and sigma are optimized as
+    log(b), atanh(rho) and log(sigma), so every step stays admissible.
+    expiries without a warm start are fitted from each skew of starts, as
+    more problems of the same batch, and keep their best fit
+
+    """
+
+    nparams = 5
+    # initial rho of the cold starts
+    starts = (-0.5, 0.0, 0.5)
+
+    @staticmethod
+    def totalvariance(params, k):
+
+        params = np.asarray(params, dtype=float)
+        a, b, rho, m, sigma = [ params[..., i, None] for i in range(SVI.nparams) ]
+        d = np.asarray(k, dtype=float) - m
+        return a + b * (rho * d + np.sqrt(d * d + sigma * sigma))
+
+    """
+
+    k, w: log moneyness and total implied variance of every quote
+    groups: integer expiry label of every quote, 0 .. G - 1
+    params0: optional (G, 5) starting parameters, ex. the fit of the
+             previous snapshot (nan rows start cold)
+    minpoints: expiries with fewer quotes are not fitted
+
+    returns (params, fitted, rmse), params (G, 5), nan where not fitted
+
+    """
+    @staticmethod
+    def fit(k, w, groups, params0 = None, minpoints = 5, maxiterations = 100):
+
+        k, w, groups = np.asarray(k, dtype=float), np.asarray(w, dtype=float), np.asarray(groups)
+        G = None if params0 is None else len(params0)
+        (kk, ww, mask) = Calibration.pad(k, w, groups, G)
+        G = len(kk)
+        count = mask.sum(axis=1)
+        fitted = count >= minpoints
+        warm = np.zeros(G, dtype=bool)
+        if params0 is not None:
+            params0 = np.asarray(params0, dtype=float).reshape(G, SVI.nparams)
+            warm = ~np.isnan(params0).any(axis=1)
+        # warm rows start from params0, cold rows from every skew in starts,
+        # all as one batch of independent problems
+        rows = np.flatnonzero(fitted & warm)
+        cold = np.flatnonzero(fitted & ~warm)
+        x = [ SVI.__transform(params0[rows]) ] if len(rows) > 0 else []
+        for rho in SVI.starts:
+            x.append(SVI.__coldstart(kk[cold], ww[cold], mask[cold], rho))
+            rows = np.append(rows, cold)
+        x = np.concatenate(x) if len(rows) > 0 else np.empty((0, SVI.nparams))
+
+        def residuals(x, problems):
+            problems = rows[problems]
+            return SVI.__residuals(x, kk[problems], ww[problems], mask[problems])
+
+        params = np.full((G, SVI.nparams), np.nan)
+        rmse = np.full(G, np.nan)
+        if len(rows) > 0:
+            (x, cost) = Calibration.levenberg(residuals, x, maxiterations)
+            # best start of every expiry
+            order = np.lexsort((cost, rows))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = rows[order][1:] != rows[order][:-1]
+            best = order[first]
+            params[rows[best]] = SVI.__untransform(x[best])
+            rmse[rows[best]] = np.sqrt(cost[best] / count[rows[best]])
+        return (params, fitted, rmse)
+
+    @staticmethod
+    def __residuals(x, k, w, mask):
+
+        a, b, rho, m, sigma = [ p[:, None] for p in SVI.__untransform(x).T ]
+        d = k - m
+        s = np.sqrt(d * d + sigma * sigma)
+        r = (a + b * (rho * d + s) - w) * mask
+        # jacobian in the transformed parameters
+        J = np.stack((np.ones_like(d), b * (rho * d + s), b * d * (1 - rho * rho),
+                      -b * (rho + d / s), b * sigma * sigma / s), axis=-1) * mask[..., None]
+        return (r, J)
+
+    @staticmethod
+    def __coldstart(k, w, mask, rho):
+
+        # vertex at the lowest quote, wings from the spread of the quotes
+        big = np.where(mask, w, np.inf)
+        low = np.argmin(big, axis=1)
+        rows = np.arange(len(k))
+        wmin = big[rows, low]
+        span = np.where(mask, k, -np.inf).max(axis=1) - np.where(mask, k, np.inf).min(axis=1)
+        span = np.where(span > 0, span, 0.1)
+        wmax = np.where(mask, w, -np.inf).max(axis=1)
+        b = np.maximum((wmax - wmin) / span, 1e-4)
+        sigma = 0.1 * span
+        params = np.column_stack((wmin - b * sigma, b, np.full(len(k), rho), k[rows, low], sigma))
+        return SVI.__transform(params)
+
+    @staticmethod
+    def __transform(params):
+
+        a, b, rho, m, sigma = params.T
+        return np.column_stack((a, np.log(np.maximum(b, 1e-12)), np.arctanh(np.clip(rho, -0.999, 0.999)), m,
+                                np.log(np.maximum(sigma, 1e-8))))
+
+    @staticmethod
+    def __untransform(x):
+
+        # log b and log sigma are capped, far beyond any smile, so trial steps cannot overflow
+        return np.column_stack((x[:, 0], np.exp(np.minimum(x[:, 1], 30)), np.tanh(x[:, 2]), x[:, 3],
+                                np.exp(np.minimum(x[:, 4], 30))))
+
+class SSVI(object):
+
+    """
+
+    surface svi (gatheral and jacquier 2014), one set of parameters per
+    underlying across all of its expiries
+
+    w(k, theta) = theta / 2 * (1 + rho * phi * k + sqrt((phi * k + rho)^2 + 1 - rho^2))
+    phi(theta) = eta / (theta^gamma * (1 + theta)^(1 - gamma))
+
+    theta is the at the money total variance of each expiry, read off the
+    quotes (linear interpolation at k = 0) and held fixed. params are rows
+    (rho, eta, gamma), with |rho| < 1, eta > 0, 0 < gamma < 1
+
+    every expiry of an ssvi surface is a raw svi slice, see tosvi
+
+    """
+
+    nparams = 3
+
+    """
+
+    k, w: log moneyness and total implied variance of every quote
+    groups: integer expiry label of every quote, 0 .. G - 1
+    symbols: integer underlying label of every expiry, 0 .. U - 1
+    params0: optional (U, 3) starting parameters (nan rows start cold)
+
+    returns (params, theta, rmse): params (U, 3), theta (G,) and rmse (U,)
+
+    """
+    @staticmethod
+    def fit(k, w, groups, symbols, params0 = None, maxiterations = 100):
+
+        k, w, groups = np.asarray(k, dtype=float), np.asarray(w, dtype=float), np.asarray(groups)
+        symbols = np.asarray(symbols)
+        theta = SSVI.atmvariance(k, w, groups, len(symbols))
+        U = int(symbols.max()) + 1 if len(symbols) > 0 else 0
+        (kk, ww, mask) = Calibration.pad(k, w, symbols[groups], U)
+        (ignored, tt, ignored) = Calibration.pad(k, theta[groups], symbols[groups], U)
+        x = np.tile([np.arctanh(-0.3), np.log(0.5), 0.0], (U, 1))
+        if params0 is not None:
+            params0 = np.asarray(params0, dtype=float).reshape(U, SSVI.nparams)
+            warm = ~np.isnan(params0).any(axis=1)
+            x[warm] = SSVI.__transform(params0[warm])
+
+        def residuals(x, rows):
+            return SSVI.__residuals(x, kk[rows], ww[rows], tt[rows], mask[rows])
+
+        (x, cost) = Calibration.levenberg(residuals, x, maxiterations)
+        return (SSVI.__untransform(x), theta, np.sqrt(cost / np.maximum(mask.sum(axis=1), 1)))
+
+    """
+
+    raw svi parameters (a, b, rho, m, sigma) of the slices with at the money
+    total variance theta of an ssvi surface with params (rho, eta, gamma)
+
+    """
+    @staticmethod
+    def tosvi(params, theta):
+
+        rho, eta, gamma = [ np.asarray(p, dtype=float) for p in np.asarray(params, dtype=float).T ]
+        phi = eta / (theta ** gamma * (1 + theta) ** (1 - gamma))
+        return np.column_stack((theta / 2 * (1 - rho * rho), theta * phi / 2, rho + 0 * theta, -rho / phi,
+                                np.sqrt(1 - rho * rho) / phi))
+
+    @staticmethod
+    def atmvariance(k, w, groups, G):
+
+        # linear interpolation of each expiry's quotes at k = 0
+        order = np.lexsort((k, groups))
+        k, w, groups = k[order], w[order], groups[order]
+        first = np.searchsorted(groups, np.arange(G + 1))
+        theta = np.full(G, np.nan)
+        for g in range(G):
+            if first[g + 1] > first[g]:
+                theta[g] = np.interp(0, k[first[g]:first[g + 1]], w[first[g]:first[g + 1]])
+        return theta
+
+    @staticmethod
+    def __residuals(x, k, w, theta, mask):
+
+        rho, eta, gamma = [ p[:, None] for p in SSVI.__untransform(x).T ]
+        theta = np.where(mask, theta, 1)
+        phi = eta / (theta ** gamma * (1 + theta) ** (1 - gamma))
+        u = phi * k + rho
+        R = np.sqrt(u * u + 1 - rho * rho)
+        r = (theta / 2 * (1 + rho * phi * k + R) - w) * mask
+        # chain rule through phi(eta, gamma) and the parameter transforms
+        dphi = theta / 2 * (rho * k + u * k / R)
+        J = np.stack((theta / 2 * (phi * k + phi * k / R) * (1 - rho * rho), dphi * phi,
+                      dphi * phi * np.log((1 + theta) / theta) * gamma * (1 - gamma)), axis=-1) * mask[..., None]
+        return (r, J)
+
+    @staticmethod
+    def __transform(params):
+
+        rho, eta, gamma = params.T
+        gamma = np.clip(gamma, 1e-6, 1 - 1e-6)
+        return np.column_stack((np.arctanh(np.clip(rho, -0.999, 0.999)), np.log(eta), np.log(gamma / (1 - gamma))))
+
+    @staticmethod
+    def __untransform(x):
+
+        # capped as in SVI, logit(gamma) saturates long before
+        return np.column_stack((np.tanh(x[:, 0]), np.exp(np.minimum(x[:, 1], 30)),
+                                1 / (1 + np.exp(-np.clip(x[:, 2], -30, 30)))))
+
+class Calibration(object):
+
+    """
+
+    batched least squares shared by SVI and SSVI
+
+    """
+
+    """
+
+    pads per quote values into (groups x points) matrices, with a mask of
+    the real entries. groups are integer labels 0 .. G - 1, G defaults to
+    the largest label + 1
+
+    """
+    @staticmethod
+    def pad(k, w, groups, G = None):
+
+        k, w, groups = np.asarray(k, dtype=float), np.asarray(w, dtype=float), np.asarray(groups)
+        if G is None: G = int(groups.max()) + 1 if len(groups) > 0 else 0
+        order = np.argsort(groups, kind="stable")
+        g = groups[order]
+        count = np.bincount(g, minlength=G)
+        rank = np.arange(len(g)) - np.searchsorted(g, g)
+        N = max(1, int(count.max()) if G > 0 else 1)
+        kk, ww, mask = np.zeros((G, N)), np.zeros((G, N)), np.zeros((G, N), dtype=bool)
+        kk[g, rank], ww[g, rank], mask[g, rank] = k[order], w[order], True
+        return (kk, ww, mask)
+
+    """
+
+    levenberg marquardt over G independent problems at once
+
+    residuals(x, rows) returns (r, J) of the problems in rows, r (n, N) and
+    J (n, N, P). each problem keeps its own damping and drops out of the
+    iteration once its cost stops improving
+
+    returns (x, cost) with cost the sum of squared residuals
+
+    """
+    @staticmethod
+    def levenberg(residuals, x, maxiterations = 100, tol = 1e-12):
+
+        x = np.array(x, dtype=float)
+        G, P = x.shape
+        rows = np.arange(G)
+        (r, J) = residuals(x, rows)
+        cost = (r * r).sum(axis=1)
+        damping = np.full(G, 1e-3)
+        active = rows.copy()
+        identity = np.eye(P)
+        for i in range(maxiterations):
+            if len(active) == 0: break
+            Ja, ra = J[active], r[active]
+            A = np.einsum("gnp,gnq->gpq", Ja, Ja)
+            g = np.einsum("gnp,gn->gp", Ja, ra)
+            # marquardt scaling, as a solve of the jacobi scaled system (unit
+            # diagonal) so badly scaled or saturated parameters stay regular
+            scale = np.sqrt(np.maximum(np.einsum("gpp->gp", A), 1e-300))
+            damped = A / scale[:, :, None] / scale[:, None, :] + damping[active, None, None] * identity
+            step = -np.linalg.solve(damped, (g / scale)[..., None])[..., 0] / scale
+            trial = x[active] + step
+            (rt, Jt) = residuals(trial, active)
+            costt = (rt * rt).sum(axis=1)
+            better = np.isfinite(costt) & (costt < cost[active])
+            accepted = active[better]
+            improvement = cost[accepted] - costt[better]
+            x[accepted], r[accepted], J[accepted] = trial[better], rt[better], Jt[better]
+            cost[accepted] = costt[better]
+            damping[accepted] = np.maximum(damping[accepted] / 3, 1e-7)
+            damping[active[~better]] *= 4
+            # converged: negligible improvement, or damping too large to move
+            done = np.zeros(len(active), dtype=bool)
+            done[better] = improvement <= tol * np.maximum(costt[better], 1e-30) + 1e-30
+            done |= damping[active] > 1e12
+            active = active[~done]
+        return (x, cost)
+
+if __name__ == "__main__":
+
+    # recovers random smiles from their values at 15 strikes
+    rng = np.random.default_rng(0)
+    true = np.column_stack((rng.uniform(0.005, 0.05, 1000), rng.uniform(0.05, 0.3, 1000), rng.uniform(-0.8, 0.2, 1000),
+                            rng.uniform(-0.1, 0.1, 1000), rng.uniform(0.05, 0.3, 1000)))
+    k = np.tile(np.linspace(-0.5, 0.5, 15), (1000, 1))
+    w = SVI.totalvariance(true, k)
+    groups = np.repeat(np.arange(1000), 15)
+    (params, fitted, rmse) = SVI.fit(k.ravel(), w.ravel(), groups)
+    print("1000 smiles, worst rmse: ", np.max(rmse), " worst parameter error: ", np.abs(params - true).max())
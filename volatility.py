@@ -1,28 +1,48 @@
 # compute implied vol
 
-import matplotlib.pyplot as plt
-from mpl_toolkits import mplot3d
+import os
+import hashlib
 import numpy as np
 import math as m
-import csv as csv
-from scipy.stats import norm
+from normdist import Normal
+from pricer import BlackScholes
+from chain import ChainLoader, OptionChain
+from surface import VolSurface
+from svi import SVI, SSVI
 
 class ImpliedVolatility(object):
 
-    def __init__(self):
+    # per quote status codes of the batched solver
+    CONVERGED = 0
+    BELOWINTRINSIC = 1
+    NOVEGA = 2
+    MAXITERATIONS = 3
+    ABOVEMAXIMUM = 4
 
-        self.error = 0.000000001
-        self.increment = self.error / 100
+    """
+
+    error: price tolerance of a solve, |BS(sigma) - C| <= error
+    maxiterations: cap on the price evaluations of a scalar solve (and on
+                   the iterations of the batched solver), bounding latency
+
+    """
+    def __init__(self, error = 0.000000001, maxiterations = 100):
+
+        self.error = error
+        self.maxiterations = maxiterations
+        # filled in by computevol / computevolfast
+        self.diagnostics = None
 
     """
     
-    compute solution for call price using black scholes solution
+    compute solution for call / put price using black scholes solution
 
-    C = S * N(d1(tau,S)) - K * exp(-r * tau) * N(d2(tau,S))
+    C = S * exp(-q * tau) * N(d1(tau,S)) - K * exp(-r * tau) * N(d2(tau,S))
+    P = K * exp(-r * tau) * N(-d2(tau,S)) - S * exp(-q * tau) * N(-d1(tau,S))
 
     where
 
-    d1 = (1 / (sigma * sqrt(tau))) * (ln(S/K) + (r + sigma^2 / 2) * tau)
+    d1 = (1 / (sigma * sqrt(tau))) * (ln(S/K) + (r - q + sigma^2 / 2) * tau)
     d2 = d1 - sigma * sqrt(tau)
 
     S = stock price
@@ -31,21 +51,25 @@ class ImpliedVolatility(object):
     t = current time
     r = risk free rate
     sigma = volatility
+    q = continuous dividend yield
+    typ = "C" / "P"
     tau = T - t (time till expiration)
 
     """
     @staticmethod
-    def computeprice(S, K, T, t, r, sigma):
+    def computeprice(S, K, T, t, r, sigma, q = 0, typ = "C"):
 
         tau = T - t
         # first compute the integral bounds
         coef = 1 / (sigma * m.sqrt(tau))
-        d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
+        d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * tau)
         d2 = d1 - (sigma * m.sqrt(tau))
+        # puts are the same expression with the signs flipped, w = -1
+        w = 1 if typ == "C" else -1
         # now compute the norm dist values
-        n1, n2 = norm.cdf(d1), norm.cdf(d2)
-        # finally we compute the call price
-        C = (S * n1) - (K * m.exp(-r * tau) * n2)
+        n1, n2 = Normal.cdf(w * d1), Normal.cdf(w * d2)
+        # finally we compute the option price
+        C = w * ((S * m.exp(-q * tau) * n1) - (K * m.exp(-r * tau) * n2))
         return C
     
     """
@@ -53,23 +77,25 @@ class ImpliedVolatility(object):
     we can improve the calculation of implied vol by utilizing the greek
     vega of the bs solution. it is defined as follows:
 
-    vega ~= d(C) / d(sigma) = S * N'(d1) * sqrt(tau)
+    vega ~= d(C) / d(sigma) = S * exp(-q * tau) * N'(d1) * sqrt(tau)
 
     where
 
     tau = T - t
-    d1 = (1 / (sigma * sqrt(tau))) * (ln(S/K) + (r + sigma^2 / 2) * tau)
+    d1 = (1 / (sigma * sqrt(tau))) * (ln(S/K) + (r - q + sigma^2 / 2) * tau)
+
+    calls and puts share the same vega
 
     """
     @staticmethod
-    def computevega(S, K, T, t, r, sigma):
+    def computevega(S, K, T, t, r, sigma, q = 0):
 
         tau = T - t
         # first compute the integral bounds
         coef = 1 / (sigma * m.sqrt(tau))
-        d1 = coef * (m.log(S / K) + (r + (sigma ** 2 / 2)) * tau)
+        d1 = coef * (m.log(S / K) + (r - q + (sigma ** 2 / 2)) * tau)
         # now compute the vega
-        v = S * norm.pdf(d1) * m.sqrt(tau)
+        v = S * m.exp(-q * tau) * Normal.pdf(d1) * m.sqrt(tau)
         return v
 
     """
@@ -87,17 +113,125 @@ class ImpliedVolatility(object):
         sigma = m.sqrt((2 * m.pi) / tau) * (C / S)
         return sigma
     
+    """
+
+    implied vol surfaces of a chain, one VolSurface per symbol
+
+    chain: OptionChain, or the path of a chain csv (loaded through the
+           binary cache)
+    symbols: symbols to build, defaults to every symbol of the chain
+    r: flat rate of the inversion, dividend yields are implied per expiry
+    cache: optional directory, surfaces are saved there as <symbol>.npz and
+           reloaded for as long as the quotes they were built from (and r,
+           nk) are unchanged
+    nk: log moneyness grid points per expiry
+    model: smile of every expiry, "spline" through the quotes, "svi" (a raw
+           svi slice per expiry) or "ssvi" (one svi surface per symbol)
+    previous: optional { symbol: VolSurface } of an earlier snapshot whose
+              svi / ssvi parameters start the calibration (by default, the
+              stale surfaces found in cache)
+
+    all symbols that are not cached go through a single batched
+    computevolchain and, for svi / ssvi, a single batched calibration of all
+    their expiries, then each is gridded by VolSurface.fromquotes
+
+    returns { symbol: VolSurface }
+
+    """
     @staticmethod
-    def volatilitysurface(path):
-        
-        """
-        IN PROGRESS
-        """
+    def volatilitysurface(chain, symbols = None, r = 0.05, cache = None, nk = 101, model = "spline",
+                          previous = None):
+
+        if model not in ("spline", "svi", "ssvi"): raise ValueError("Unknown smile model " + str(model))
+        if not isinstance(chain, OptionChain): chain = OptionChain(ChainLoader.cached(chain))
+        if symbols is None: symbols = chain.symbols()
+        if cache is not None: os.makedirs(cache, exist_ok = True)
+        previous = {} if previous is None else dict(previous)
+        surfaces = {}
+        stale = []
+        for symbol in symbols:
+            (lo, hi) = chain.range(symbol)
+            if lo == hi: continue
+            fingerprint = ImpliedVolatility.__fingerprint(chain.sel(symbol), r, nk, model)
+            path = None if cache is None else os.path.join(cache, symbol + ".npz")
+            if path is not None and os.path.exists(path):
+                surface = VolSurface.load(path)
+                if surface.fingerprint == fingerprint:
+                    surfaces[symbol] = surface
+                    continue
+                previous.setdefault(symbol, surface)
+            stale.append((symbol, lo, hi, fingerprint, path))
+        if len(stale) == 0: return surfaces
+
+        # one inversion over the rows of every stale symbol
+        rows = np.concatenate([ np.arange(lo, hi) for (symbol, lo, hi, fingerprint, path) in stale ])
+        (prices, S, K, T, typ, groups) = [ np.asarray(a)[rows] for a in chain.quotes() ]
+        (sigma, status, q) = ImpliedVolatility().computevolchain(prices, S, K, T, r, typ, groups)
+        sigma = np.where(status == ImpliedVolatility.CONVERGED, sigma, np.nan)
+        forwards = S * np.exp((r - q) * T)
+        quotes = np.cumsum([0] + [ hi - lo for (symbol, lo, hi, fingerprint, path) in stale ])
+        slices = [ slice(quotes[i], quotes[i + 1]) for i in range(len(stale)) ]
+        params = [ None ] * len(stale)
+        ssvi = [ None ] * len(stale)
+        if model != "spline":
+            (params, ssvi) = ImpliedVolatility.__calibrate(stale, slices, T, forwards, K, sigma, typ, model, previous)
+        for (i, (symbol, lo, hi, fingerprint, path)) in enumerate(stale):
+            quote = slices[i]
+            if np.isnan(sigma[quote]).all(): continue
+            surface = VolSurface.fromquotes(symbol, S[quote][0], T[quote], forwards[quote], K[quote], sigma[quote],
+                                            typ[quote], nk, params[i])
+            surface.ssvi = ssvi[i]
+            surface.fingerprint = fingerprint
+            if path is not None: surface.save(path)
+            surfaces[symbol] = surface
+        return surfaces
 
-        # graph implied vol versus: strike and time to maturtiy
-        prices = ImpliedVolatility.__csvtolist(path)
-        # ax = plt.axes(projection='3d')
-        # ax.plot3D(rw.x, rw.y, rw.z)
+    @staticmethod
+    def __calibrate(stale, slices, T, forwards, K, sigma, typ, model, previous):
+
+        # the quotes of every expiry of every stale symbol, labeled by
+        # expiry (groups) and the symbol of each expiry (owner)
+        (k, w, groups, owner, expiries, start) = ([], [], [], [], [], [0])
+        for (i, (symbol, lo, hi, fingerprint, path)) in enumerate(stale):
+            quote = slices[i]
+            valid = VolSurface.select(T[quote], forwards[quote], K[quote], sigma[quote], typ[quote])
+            (t, inverse) = np.unique(T[quote][valid], return_inverse = True)
+            k.append(np.log(K[quote][valid] / forwards[quote][valid]))
+            w.append(sigma[quote][valid] ** 2 * T[quote][valid])
+            groups.append(start[-1] + inverse.ravel())
+            owner.append(np.full(len(t), i))
+            expiries.append(t)
+            start.append(start[-1] + len(t))
+        (k, w, groups, owner) = [ np.concatenate(a) for a in (k, w, groups, owner) ]
+        G = start[-1]
+
+        if model == "svi":
+            # warm start from the slice of the previous surface at the same expiry
+            params0 = np.full((G, SVI.nparams), np.nan)
+            for (i, (symbol, lo, hi, fingerprint, path)) in enumerate(stale):
+                before = previous.get(symbol)
+                if before is None or before.params is None: continue
+                j = np.clip(np.searchsorted(before.T, expiries[i]), 0, len(before.T) - 1)
+                same = np.abs(before.T[j] - expiries[i]) < 0.5 / 365
+                params0[start[i]:start[i + 1]][same] = before.params[j[same]]
+            (params, fitted, rmse) = SVI.fit(k, w, groups, params0)
+            return ([ params[start[i]:start[i + 1]] for i in range(len(stale)) ], [ None ] * len(stale))
+
+        params0 = np.full((len(stale), SSVI.nparams), np.nan)
+        for (i, (symbol, lo, hi, fingerprint, path)) in enumerate(stale):
+            before = previous.get(symbol)
+            if before is not None and before.ssvi is not None: params0[i] = before.ssvi
+        (params, theta, rmse) = SSVI.fit(k, w, groups, owner, params0)
+        slices = SSVI.tosvi(params[owner], theta)
+        return ([ slices[start[i]:start[i + 1]] for i in range(len(stale)) ], list(params))
+
+    @staticmethod
+    def __fingerprint(chain, r, nk, model):
+
+        digest = hashlib.sha1(repr((r, nk, model)).encode())
+        for column in ("mid", "price", "strike", "dte", "type", "expiry"):
+            digest.update(np.ascontiguousarray(chain[column]).tobytes())
+        return digest.hexdigest()
 
     """
     
@@ -106,25 +240,21 @@ class ImpliedVolatility(object):
     sigma value
     similarly, if our computed value is lower than desired, increase sigma
 
+    the root is bracketed between sigma = 0 (the discounted intrinsic value)
+    and a vol pricing above C, and solved with brent's method (inverse
+    quadratic interpolation / secant steps, safeguarded by bisection), so it
+    converges for every quote inside the no arbitrage bounds in at most
+    self.maxiterations price evaluations
+
+    C is the price of a call or, with typ = "P", a put, and q the
+    continuous dividend yield
+
+    returns nan when there is no solution, see self.diagnostics for why
+
     """
-    def computevol(self, C, S, K, T, t, r):
+    def computevol(self, C, S, K, T, t, r, q = 0, typ = "C"):
 
-        increase = True
-        # first thing we do is compute the intial guess for IV
-        sigma = self.initialguess(C, S, T, t)
-        # now update sigma until our recorded call price matches BS result
-        print("Computing Implied Vol...")
-        while (1):
-            computed = self.computeprice(S, K, T, t, r, sigma)
-            difference = computed - C
-            # if we have reached a sufficient value, break out
-            if (abs(difference) <= self.error):
-                return sigma
-            # otherwise, update sigma and try again
-            if (difference > 0): increase = False
-            else: increase = True
-            sigma = self.__updatesigma(sigma, increase)
-            # print("New Sigma: ", sigma)
+        return self.__solve(C, S, K, T, t, r, q, typ, newton = False)
 
     """
     
@@ -144,68 +274,487 @@ class ImpliedVolatility(object):
     and we know the partial derivative of BS(sigma) wrt sigma is vega. thus
 
     sigma_N+1 = sigma_N - [ BS(sigma_N) - C ] / vega(sigma_N)
+
+    newton can overshoot or stall where vega vanishes (far otm or short
+    dated quotes), so the iteration keeps the same bracket as computevol and
+    bisects whenever the newton step leaves it or does not at least halve
+    the residual
     
     """
-    def computevolfast(self, C, S, K, T, t, r):
+    def computevolfast(self, C, S, K, T, t, r, q = 0, typ = "C"):
+
+        return self.__solve(C, S, K, T, t, r, q, typ, newton = True)
+
+    """
 
-        # first thing we do is compute the intial guess for IV
+    shared driver of computevol / computevolfast. checks the no arbitrage
+    bounds, brackets the root and runs the selected iteration, recording
+
+    self.diagnostics = { "method", "status", "iterations", "residual" }
+
+    for the last solve. status is one of the batched solver status codes,
+    iterations counts price evaluations and residual is BS(sigma) - C
+
+    """
+    def __solve(self, C, S, K, T, t, r, q, typ, newton):
+
+        tau = T - t
+        forward, strike = S * m.exp(-q * tau), K * m.exp(-r * tau)
+        intrinsic = max(0, forward - strike) if typ == "C" else max(0, strike - forward)
+        upper = forward if typ == "C" else strike
+        method = "newton" if newton else "brent"
+        self.diagnostics = { "method": method, "status": ImpliedVolatility.MAXITERATIONS,
+                             "iterations": 0, "residual": m.nan }
+        # outside the no arbitrage bounds there is nothing to solve
+        if C < intrinsic - self.error: return self.__finish(m.nan, ImpliedVolatility.BELOWINTRINSIC, intrinsic - C)
+        if C >= upper: return self.__finish(m.nan, ImpliedVolatility.ABOVEMAXIMUM, upper - C)
+        if C - intrinsic <= self.error: return self.__finish(m.nan, ImpliedVolatility.NOVEGA, intrinsic - C)
+
+        f = lambda sigma: self.__residual(sigma, C, S, K, T, t, r, q, typ, intrinsic)
+        # bracket [lo, hi] with f(lo) < 0 < f(hi), growing hi as needed
+        lo, flo = 0.0, intrinsic - C
+        hi = 5.0
+        fhi = f(hi)
+        for i in range(10):
+            if fhi > 0: break
+            lo, flo = hi, fhi
+            hi *= 4
+            fhi = f(hi)
+        if fhi <= 0: return self.__finish(m.nan, ImpliedVolatility.MAXITERATIONS, fhi)
+        # narrow the bracket with the closed form guess
         sigma = self.initialguess(C, S, T, t)
-        # now update sigma until our recorded call price matches BS result
-        print("Computing Implied Vol...")
-        count = 0
-        while (1):
-            computed = self.computeprice(S, K, T, t, r, sigma)
-            difference = computed - C
-            # if we have reached a sufficient value, break out
-            if (abs(difference) <= self.error):
-                return sigma
-            # otherwise, compute a new sigma
-            if (difference > 0): increase = False
-            else: increase = True
-            sigma = self.__updatesigmafast(difference, S, K, T, t, r, sigma)
-            # if sigma is -1, that means we have to use slow update
-            if (sigma == -1): sigma = self.__updatesigma(sigma, increase)
-            print("New Sigma: ", sigma)
-
-    def __updatesigma(self, sigma, increase):
+        if lo < sigma < hi:
+            fsigma = f(sigma)
+            if fsigma > 0: hi, fhi = sigma, fsigma
+            else: lo, flo = sigma, fsigma
+
+        if newton: return self.__newton(f, sigma, C, S, K, T, t, r, q, lo, hi, flo, fhi)
+        return self.__brent(f, lo, hi, flo, fhi)
+
+    def __residual(self, sigma, C, S, K, T, t, r, q, typ, intrinsic):
+
+        self.diagnostics["iterations"] += 1
+        # the zero vol limit of the price is the discounted intrinsic value
+        if sigma <= 0: return intrinsic - C
+        return self.computeprice(S, K, T, t, r, sigma, q, typ) - C
+
+    def __finish(self, sigma, status, residual):
+
+        self.diagnostics["status"] = status
+        self.diagnostics["residual"] = residual
+        return sigma
+
+    """
+
+    sigma_N+1 = sigma_N - [ BS(sigma_N) - C ] / vega(sigma_N), kept inside
+    the bracket [lo, hi] by bisection, starting from the guess sigma
+    clamped to the bracket
+
+    """
+    def __newton(self, f, sigma, C, S, K, T, t, r, q, lo, hi, flo, fhi):
+
+        sigma = min(max(sigma, lo), hi)
+        previous = m.inf
+        while self.diagnostics["iterations"] < self.maxiterations:
+            difference = f(sigma)
+            if abs(difference) <= self.error:
+                return self.__finish(sigma, ImpliedVolatility.CONVERGED, difference)
+            # prices increase with vol, so the sign tells which end to move
+            if difference > 0: hi = sigma
+            else: lo = sigma
+            # the bracket cannot shrink any further in double precision
+            if hi - lo <= 4 * np.finfo(float).eps * hi:
+                return self.__finish(sigma, ImpliedVolatility.CONVERGED, difference)
+            newsig = self.__updatesigmafast(difference, S, K, T, t, r, sigma, q)
+            # bisect when newton leaves the bracket or converges too slowly
+            if not (lo < newsig < hi) or abs(difference) > previous / 2:
+                newsig = (lo + hi) / 2
+            previous = abs(difference)
+            sigma = newsig
+        return self.__finish(sigma, ImpliedVolatility.MAXITERATIONS, difference)
+
+    """
+
+    brent's method on the bracket [a, b], following the classic zbrent
+    formulation: b is the best estimate, a the previous one and c the
+    opposite end of the bracket
+
+    """
+    def __brent(self, f, a, b, fa, fb):
+
+        c, fc = a, fa
+        d = e = b - a
+        while True:
+            if (fb > 0) == (fc > 0):
+                c, fc = a, fa
+                d = e = b - a
+            # keep b as the end with the smallest residual
+            if abs(fc) < abs(fb):
+                a, b, c = b, c, b
+                fa, fb, fc = fb, fc, fb
+            if abs(fb) <= self.error:
+                return self.__finish(b, ImpliedVolatility.CONVERGED, fb)
+            tol = 2 * np.finfo(float).eps * abs(b)
+            half = (c - b) / 2
+            # the bracket cannot shrink any further in double precision
+            if abs(half) <= tol:
+                return self.__finish(b, ImpliedVolatility.CONVERGED, fb)
+            if self.diagnostics["iterations"] >= self.maxiterations:
+                return self.__finish(b, ImpliedVolatility.MAXITERATIONS, fb)
+            if abs(e) >= tol and abs(fa) > abs(fb):
+                # inverse quadratic interpolation, or secant with two points
+                s = fb / fa
+                if a == c:
+                    p = 2 * half * s
+                    q = 1 - s
+                else:
+                    q, r = fa / fc, fb / fc
+                    p = s * (2 * half * q * (q - r) - (b - a) * (r - 1))
+                    q = (q - 1) * (r - 1) * (s - 1)
+                if p > 0: q = -q
+                p = abs(p)
+                # accept the interpolation only if it stays well inside
+                if 2 * p < min(3 * half * q - abs(tol * q), abs(e * q)):
+                    e, d = d, p / q
+                else:
+                    d = e = half
+            else:
+                d = e = half
+            a, fa = b, fb
+            b += d if abs(d) > tol else m.copysign(tol, half)
+            fb = f(b)
 
-        newsig = 0
-        if (increase): newsig = sigma + self.increment
-        else: newsig = sigma - self.increment
-        return newsig 
-    
     """
     
     sigma_N+1 = sigma_N - [ BS(sigma_N) - C ] / vega(sigma_N)
+
+    returns -1 when vega is 0 and the step is undefined
     
     """
-    def __updatesigmafast(self, difference, S, K, T, t, r, sigma):
+    def __updatesigmafast(self, difference, S, K, T, t, r, sigma, q = 0):
 
         newsig = 0
         # need to compute vega
-        vega = self.computevega(S, K, T, t, r, sigma)
+        vega = self.computevega(S, K, T, t, r, sigma, q)
         # cannot apply the fast algo if vega is 0!
         if (vega == 0): return -1
-        # now with newton's method
-        newsig = sigma - difference / vega
+        # now with newton's method, a step overflowing on a tiny vega leaves
+        # the bracket and is replaced by bisection
+        with np.errstate(over='ignore'):
+            newsig = sigma - difference / vega
         return newsig 
     
-    def __csvtolist(file):
+    """
+
+    batched implied vol for a whole chain of quotes at once
+
+    prices, S, K, T, r, q: broadcastable arrays, T is the time to expiry
+    typ: "C" / "P" per quote
+    prices may also be an OptionChain, which then supplies S, K, T and typ
+    (see OptionChain.quotes), ex. iv.computevolbatch(chain, r = 0.05)
+    sigma0: optional starting vols, defaults to the brenner subrahmanyam guess
+
+    every quote runs a safeguarded newton iteration inside its own bracket
+    [lo, hi]: the bracket shrinks with the sign of BS(sigma) - price, and any
+    newton step that leaves it (or has no vega to divide by) is replaced by
+    bisection. quotes drop out of the iteration as soon as they converge
+
+    returns (sigma, status) arrays, with status one of:
+    CONVERGED       |BS(sigma) - price| <= self.error (relative to the time
+                    value when it is below one)
+    BELOWINTRINSIC  price below the discounted intrinsic value, no solution
+    ABOVEMAXIMUM    price above S * exp(-qT) (calls) / K * exp(-rT) (puts)
+    NOVEGA          price is flat in sigma, ie. within tolerance of intrinsic
+                    or vega underflows, so the vol is undefined
+    MAXITERATIONS   no convergence within self.maxiterations
+    sigma is nan for everything but CONVERGED
+
+    """
+    def computevolbatch(self, prices, S = None, K = None, T = None, r = 0, q = 0, typ = "C", sigma0 = None):
+
+        if isinstance(prices, OptionChain): (prices, S, K, T, typ, groups) = prices.quotes()
+        prices, S, K, T, r, q, typ = np.broadcast_arrays(prices, S, K, T, r, q, typ)
+        shape = prices.shape
+        prices, S, K, T, r, q, typ = [ a.ravel() for a in (prices, S, K, T, r, q, typ) ]
+        prices, S, K, T, r, q = [ a.astype(float) for a in (prices, S, K, T, r, q) ]
+        w = np.where(typ == "C", 1.0, -1.0)
+        sigma = np.full(len(prices), np.nan)
+        status = np.full(len(prices), ImpliedVolatility.MAXITERATIONS)
+        # no arbitrage bounds of the price
+        forward = S * np.exp(-q * T)
+        strike = K * np.exp(-r * T)
+        intrinsic = np.maximum(0, w * (forward - strike))
+        upper = np.where(w > 0, forward, strike)
+        # tolerance on the time value (relative below one), but never below
+        # what double precision can resolve on the price itself
+        timevalue = prices - intrinsic
+        tolerance = np.maximum(self.error * np.minimum(1, timevalue), 1e-14 * prices)
+        # a price indistinguishable from intrinsic carries no vol information
+        status[timevalue <= tolerance] = ImpliedVolatility.NOVEGA
+        status[prices < intrinsic - self.error] = ImpliedVolatility.BELOWINTRINSIC
+        status[prices >= upper] = ImpliedVolatility.ABOVEMAXIMUM
+        active = np.flatnonzero(status == ImpliedVolatility.MAXITERATIONS)
+
+        # starting point and bracket of each remaining quote
+        if sigma0 is None: guess = np.sqrt((2 * m.pi) / T) * (prices / S)
+        else: guess = np.broadcast_to(np.asarray(sigma0, dtype=float), shape).ravel().copy()
+        guess = np.clip(np.nan_to_num(guess, nan=0.2), 0.001, 5.0)
+        lo, hi = np.zeros(len(prices)), np.full(len(prices), 5.0)
+        # grow the upper end of the bracket until it prices above the quote
+        for i in range(10):
+            p = BlackScholes.price(typ[active], S[active], K[active], T[active], r[active], q[active], hi[active], usecache = False)
+            low = active[p < prices[active]]
+            if len(low) == 0: break
+            hi[low] *= 4
+        x = guess
+
+        for i in range(self.maxiterations):
+            if len(active) == 0: break
+            s = x[active]
+            g = BlackScholes.all_greeks(typ[active], S[active], K[active], T[active], r[active], q[active], s,
+                                        ['vega'], usecache = False)
+            difference = g['price'] - prices[active]
+            vega = g['vega']
+            # absolute tolerance, relative for quotes priced below one
+            done = np.abs(difference) <= tolerance[active]
+            sigma[active[done]] = s[done]
+            status[active[done]] = ImpliedVolatility.CONVERGED
+            # shrink the bracket, prices are increasing in vol
+            above = difference > 0
+            hi[active[above]] = np.minimum(hi[active[above]], s[above])
+            lo[active[~above]] = np.maximum(lo[active[~above]], s[~above])
+            # newton step, falling back to bisection outside the bracket
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                step = s - difference / vega
+            l, h = lo[active], hi[active]
+            bisect = ~((step > l) & (step < h)) | (vega <= 0)
+            step = np.where(bisect, (l + h) / 2, step)
+            # a collapsed bracket without a price match means no vega, as does
+            # a vega underflowing to zero on a quote within self.error of
+            # intrinsic (which computevol reports as NOVEGA up front)
+            flat = ~done & ((h - l <= 1e-15 * h) | ((vega <= 0) & (timevalue[active] <= self.error)))
+            status[active[flat]] = ImpliedVolatility.NOVEGA
+            x[active] = step
+            active = active[~done & ~flat]
+
+        return (sigma.reshape(shape), status.reshape(shape))
+
+    """
+
+    per expiry implied forwards from put call parity
+
+    C - P = exp(-rT) * (F - K)
+
+    so every call / put pair quoted at the same strike gives an estimate
+    F = K + exp(rT) * (C - P). the pairs nearest the money (smallest
+    |C - P|) have the tightest quotes, so each expiry takes the median of
+    its `pairs` nearest the money estimates
+
+    groups: expiry label of each quote, ex. symbol + expiry date (quotes of
+            different underlyings must not share a group)
+
+    prices may also be an OptionChain, as in computevolbatch
+
+    returns the forward of each quote's expiry, nan where the expiry has no
+    call put pair
+
+    """
+    @staticmethod
+    def impliedforwards(prices, K = None, T = None, r = 0, typ = None, groups = None, pairs = 5):
+
+        if isinstance(prices, OptionChain): (prices, S, K, T, typ, groups) = prices.quotes()
+        prices, K, T, r, typ, groups = np.broadcast_arrays(prices, K, T, r, typ, groups)
+        shape = prices.shape
+        prices, K, T, r, typ, groups = [ a.ravel() for a in (prices, K, T, r, typ, groups) ]
+        (labels, codes) = np.unique(groups, return_inverse = True)
+        codes = codes.ravel()
+        # sorted by expiry and strike, a call directly followed by the put of
+        # the same expiry and strike is a parity pair
+        order = np.lexsort((typ, K, codes))
+        c, k, kind = codes[order], K[order], typ[order]
+        paired = (kind[:-1] == "C") & (kind[1:] == "P") & (c[:-1] == c[1:]) & (k[:-1] == k[1:])
+        calls, puts = order[:-1][paired], order[1:][paired]
+        parity = prices[calls] - prices[puts]
+        estimates = K[calls] + np.exp(r[calls] * T[calls]) * parity
+        group = codes[calls]
+        # rank the pairs of each expiry by distance to the money
+        nearest = np.lexsort((np.abs(parity), group))
+        group, estimates = group[nearest], estimates[nearest]
+        rank = np.arange(len(group)) - np.searchsorted(group, group)
+        group, estimates = group[rank < pairs], estimates[rank < pairs]
+        # median per expiry
+        ranked = np.lexsort((estimates, group))
+        group, estimates = group[ranked], estimates[ranked]
+        counts = np.bincount(group, minlength = len(labels))
+        first = np.searchsorted(group, np.arange(len(labels)))
+        quoted = counts > 0
+        forwards = np.full(len(labels), np.nan)
+        middle = first[quoted] + (counts[quoted] - 1) // 2
+        forwards[quoted] = (estimates[middle] + estimates[first[quoted] + counts[quoted] // 2]) / 2
+        return forwards[codes].reshape(shape)
+
+    """
+
+    inverts a whole chain of calls and puts in one pass. the dividend yield
+    of every expiry is implied from its forward, q = r - ln(F / S) / T
+    (q = 0 for expiries without call put pairs), and all quotes then go
+    through a single computevolbatch
+
+    prices may also be an OptionChain, as in computevolbatch
+
+    returns (sigma, status, q)
+
+    """
+    def computevolchain(self, prices, S = None, K = None, T = None, r = 0, typ = None, groups = None, pairs = 5):
 
-        with open(file, newline= '') as csvfile:
-            reader = csv.reader(csvfile)
-            rawData = list(reader)
-        cleaned = ImpliedVolatility.__cleanrawdata(rawData)
-        return cleaned
+        if isinstance(prices, OptionChain): (prices, S, K, T, typ, groups) = prices.quotes()
+        forwards = self.impliedforwards(prices, K, T, r, typ, groups, pairs)
+        forwards, S, T, r = np.broadcast_arrays(forwards, S, T, r)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            q = np.where(np.isnan(forwards), 0, r - np.log(forwards / S) / T)
+        (sigma, status) = self.computevolbatch(prices, S, K, T, r, q, typ)
+        return (sigma, status, q)
 
-    def __cleanrawdata(rawdata):
+    """
+
+    non iterative implied vol for calls and puts, scalars or broadcastable
+    arrays, after jaeckel's "let's be rational" (2015)
+
+    the quote is normalized to the undiscounted black price of an out of
+    the money option in log moneyness x = -|ln(F / K)| and total vol
+    s = sigma * sqrt(T) (in the money quotes through put call parity)
+
+    b(x, s) = exp(x / 2) * N(x / s + s / 2) - exp(-x / 2) * N(x / s - s / 2)
+
+    b is convex in s below s_c = sqrt(2|x|) and concave above it. the
+    initial guess interpolates the inverse of b on four branches around s_c
+    with cubics in coordinates where b is nearly linear: the lower tail
+    through (2pi|x| / 3sqrt3) * N(-|x| / (sqrt3 s))^3, the upper tail
+    through N(-s / 2). it is then polished by a fixed number of third order
+    householder steps, on 1 / ln(b) in the lower tail and on b elsewhere
+
+    two steps reach a relative vol error below 1e-12 on out of the money
+    quotes across 1e-3 <= s <= 6, at a cost of five evaluations of b. deep
+    in the money quotes are only as accurate as their time value, which
+    the subtraction of the intrinsic value leaves
+
+    prices may also be an OptionChain, as in computevolbatch
+
+    returns sigma (nan for quotes outside the no arbitrage bounds)
+
+    """
+    @staticmethod
+    def computevolrational(prices, S = None, K = None, T = None, r = 0, q = 0, typ = "C", steps = 2):
+
+        if isinstance(prices, OptionChain): (prices, S, K, T, typ, groups) = prices.quotes()
+        scalar = not any([ isinstance(a, (np.ndarray, list, tuple)) for a in (prices, S, K, T, r, q, typ) ])
+        prices, S, K, T, r, q, typ = np.broadcast_arrays(prices, S, K, T, r, q, typ)
+        prices, S, K, T, r, q = [ a.astype(float) for a in (prices, S, K, T, r, q) ]
+        theta = np.where(typ == "C", 1.0, -1.0)
+        forward = S * np.exp((r - q) * T)
+        discount = np.exp(-r * T)
+        x = np.log(forward / K)
+        # normalized price, less the intrinsic value of in the money quotes
+        beta = prices / (discount * np.sqrt(forward * K))
+        itm = theta * x > 0
+        beta = np.where(itm, beta - theta * (np.exp(x / 2) - np.exp(-x / 2)), beta)
+        x = -np.abs(x)
+        valid = (beta > 0) & (beta < np.exp(x / 2)) & (T > 0)
+        beta = np.where(valid, beta, np.exp(x / 2) / 2)
+
+        with np.errstate(all='ignore'):
+            (s, lower) = ImpliedVolatility.__rationalguess(x, beta)
+            for i in range(steps):
+                s = ImpliedVolatility.__householder(x, beta, s, lower)
+            sigma = np.where(valid, s / np.sqrt(T), np.nan)
+
+        if scalar: return float(sigma)
+        return sigma
 
-        cleaned = []
-        for entry in rawdata[1:len(rawdata)-1]:
-            stock, typ, price = entry[1], entry[2], entry[7]
-            combined = [stock, typ, price]
-            if typ == "Call": cleaned.append(combined)
-        return cleaned
+    @staticmethod
+    def __normalizedprice(x, s):
+
+        # b(x, s) for x <= 0. below s_c both terms underflow together, so
+        # factor out n(x / s +- s / 2) exp(+-x / 2) = n(h) n(t) sqrt(2pi)
+        h, t = x / s, s / 2
+        tails = np.exp(-(h * h + t * t) / 2) / Normal.sqrt2pi * (Normal.mills(-h - t) - Normal.mills(t - h))
+        body = np.exp(x / 2) * Normal.cdf(h + t) - np.exp(-x / 2) * Normal.cdf(h - t)
+        return np.where(h + t < 0, tails, body)
+
+    @staticmethod
+    def __normalizedvega(x, s):
+
+        h = x / s
+        return np.exp(-(h * h + s * s / 4) / 2) / Normal.sqrt2pi
+
+    @staticmethod
+    def __hermite(y, y0, y1, d0, d1, width):
+
+        # cubic through (0, y0) and (1, y1) with slopes d0, d1 per unit of width
+        y2 = y * y
+        y3 = y2 * y
+        return ((2 * y3 - 3 * y2 + 1) * y0 + (y3 - 2 * y2 + y) * width * d0
+                + (3 * y2 - 2 * y3) * y1 + (y3 - y2) * width * d1)
+
+    @staticmethod
+    def __rationalguess(x, beta):
+
+        b = ImpliedVolatility.__normalizedprice
+        vega = ImpliedVolatility.__normalizedvega
+        hermite = ImpliedVolatility.__hermite
+        ax = np.maximum(-x, 1e-300)
+        bmax = np.exp(x / 2)
+        # inflection point s_c and the tangents there, which split the four branches
+        sc = np.sqrt(2 * ax)
+        bc, vc = b(x, sc), vega(x, sc)
+        sl = sc - bc / vc
+        bl, vl = b(x, sl), vega(x, sl)
+        su = sc + (bmax - bc) / vc
+        bu, vu = b(x, su), vega(x, su)
+
+        # lower tail: f(s) = A * N(z)^3, z = -|x| / (sqrt3 s), equals b to
+        # leading order as s -> 0. interpolate f(beta) from f(0) = 0, f' = 1
+        a = 2 * m.pi * ax / (3 * m.sqrt(3))
+        zl = -ax / (m.sqrt(3) * sl)
+        fl = a * Normal.cdf(zl) ** 3
+        dfl = 3 * fl / Normal.cdf(zl) * Normal.pdf(zl) * ax / (m.sqrt(3) * sl * sl) / vl
+        f = np.clip(hermite(beta / bl, 0, fl, 1, dfl, bl), 0, fl)
+        slower = ax / (-m.sqrt(3) * Normal.ppf(np.cbrt(f / a)))
+        # the two central branches interpolate s(beta) directly
+        smiddle = hermite((beta - bl) / (bc - bl), sl, sc, 1 / vl, 1 / vc, bc - bl)
+        supper = hermite((beta - bc) / (bu - bc), sc, su, 1 / vc, 1 / vu, bu - bc)
+        # upper tail: f(s) = N(-s / 2), with bmax - b ~ (exp(x/2) + exp(-x/2)) f
+        fu = Normal.cdf(-su / 2)
+        dfu = -Normal.pdf(su / 2) / 2 / vu
+        f = hermite((beta - bu) / (bmax - bu), fu, 0, dfu, -1 / (bmax + 1 / bmax), bmax - bu)
+        stail = -2 * Normal.ppf(np.clip(f, 1e-300, fu))
+
+        s = np.where(beta < bl, slower, np.where(beta < bc, smiddle, np.where(beta < bu, supper, stail)))
+        # at the money b = 2 N(s / 2) - 1 inverts exactly
+        atm = x == 0
+        s = np.where(atm, 2 * Normal.ppf((1 + beta) / 2), s)
+        return (s, (beta < bl) & ~atm)
+
+    @staticmethod
+    def __householder(x, beta, s, lower):
+
+        # b and its first three derivatives in s
+        b = ImpliedVolatility.__normalizedprice(x, s)
+        b1 = ImpliedVolatility.__normalizedvega(x, s)
+        r2 = x * x / s ** 3 - s / 4
+        b2 = b1 * r2
+        b3 = b1 * (r2 * r2 - 3 * x * x / s ** 4 - 0.25)
+        # g = 1 / ln(b) - 1 / ln(beta) in the lower tail, g = b - beta elsewhere
+        l = np.log(b)
+        l1 = b1 / b
+        l2 = b2 / b - l1 ** 2
+        l3 = b3 / b - 3 * l1 * b2 / b + 2 * l1 ** 3
+        g = np.where(lower, 1 / l - 1 / np.log(beta), b - beta)
+        g1 = np.where(lower, -l1 / l ** 2, b1)
+        g2 = np.where(lower, -l2 / l ** 2 + 2 * l1 ** 2 / l ** 3, b2)
+        g3 = np.where(lower, -l3 / l ** 2 + 6 * l1 * l2 / l ** 3 - 6 * l1 ** 3 / l ** 4, b3)
+        nu, h2, h3 = -g / g1, g2 / g1, g3 / g1
+        return s + nu * (1 + h2 * nu / 2) / (1 + nu * (h2 + h3 * nu / 6))
 
 if __name__ == "__main__":
 
@@ -220,4 +769,8 @@ if __name__ == "__main__":
     print("Call Price: ", C)
     iv = ImpliedVolatility()
     newsig = iv.computevolfast(C, S, K, T, t, r)
+    print("Implied Volatility: ", newsig, iv.diagnostics)
+    newsig = iv.computevol(C, S, K, T, t, r)
+    print("Implied Volatility: ", newsig, iv.diagnostics)
+    newsig = ImpliedVolatility.computevolrational(C, S, K, T - t, r)
     print("Implied Volatility: ", newsig)
@@ -0,0 +1,121 @@
+# lmarolda - incremental implied vol engine
+
+import numpy as np
+import math as m
+from volatility import ImpliedVolatility
+from chain import OptionChain
+
+class VolEngine(object):
+
+    """
+
+    stateful implied vols of a chain whose quotes tick
+
+    every contract keeps its last quote and solved vol in contiguous arrays
+    (contract i is row i of the arrays / chain it was built from). update
+    takes only the contracts whose quotes changed, re-solves just those
+    through ImpliedVolatility.computevolbatch, starting the newton iteration
+    from their previous vol, and reports which vols moved. a tick moves the
+    vol a little, so the warm start is a step or two from the root and an
+    update costs O(changed quotes), whatever the size of the chain
+
+    prices, S, K, T, r, q, typ: as in ImpliedVolatility.computevolbatch, or
+    an OptionChain as prices (see also fromchain)
+    threshold: smallest change of sigma reported as a move
+    solver: the ImpliedVolatility whose tolerances are used
+
+    """
+
+    def __init__(self, prices, S = None, K = None, T = None, r = 0, q = 0, typ = "C", threshold = 1e-6, solver = None):
+
+        if isinstance(prices, OptionChain): (prices, S, K, T, typ, groups) = prices.quotes()
+        prices, S, K, T, r, q, typ = np.broadcast_arrays(prices, S, K, T, r, q, typ)
+        self.__prices, self.__S, self.__K, self.__T, self.__r, self.__q = [
+            np.array(a, dtype=float).ravel() for a in (prices, S, K, T, r, q) ]
+        self.__typ = np.array(typ).ravel()
+        self.threshold = threshold
+        self.solver = ImpliedVolatility() if solver is None else solver
+        (self.__sigma, self.__status) = self.solver.computevolbatch(self.__prices, self.__S, self.__K, self.__T,
+                                                                    self.__r, self.__q, self.__typ)
+
+    """
+
+    engine over an OptionChain with the dividend yield of every expiry
+    implied from put call parity, as in ImpliedVolatility.computevolchain,
+    and then held fixed across updates
+
+    """
+    @staticmethod
+    def fromchain(chain, r = 0, price = "mid", threshold = 1e-6, solver = None):
+
+        (prices, S, K, T, typ, groups) = chain.quotes(price)
+        forwards = ImpliedVolatility.impliedforwards(prices, K, T, r, typ, groups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            q = np.where(np.isnan(forwards), 0, r - np.log(forwards / S) / T)
+        return VolEngine(prices, S, K, T, r, q, typ, threshold, solver)
+
+    def __len__(self):
+
+        return len(self.__prices)
+
+    @property
+    def sigma(self): return self.__sigma
+
+    @property
+    def status(self): return self.__status
+
+    @property
+    def prices(self): return self.__prices
+
+    @property
+    def S(self): return self.__S
+
+    """
+
+    index: contracts whose quotes changed (integer rows)
+    prices: their new prices, S: optionally their new spot
+    (scalars or arrays matching index)
+
+    re-solves those contracts only, seeded with their previous vol (the
+    brenner subrahmanyam guess where there was none). when index repeats a
+    contract, its last quote wins
+
+    returns the contracts of index whose vol moved by more than
+    self.threshold or whose status changed, ex. a quote dropping below
+    intrinsic. their new vols are in self.sigma / self.status
+
+    """
+    def update(self, index, prices, S = None):
+
+        index = np.asarray(index, dtype=np.intp).ravel()
+        if len(index) == 0: return index
+        self.__prices[index] = np.broadcast_to(np.asarray(prices, dtype=float).ravel(), index.shape)
+        if S is not None: self.__S[index] = np.broadcast_to(np.asarray(S, dtype=float).ravel(), index.shape)
+        # repeated contracts are solved once, with their last quote
+        index = np.unique(index)
+        prices, S, T = self.__prices[index], self.__S[index], self.__T[index]
+        before, status = self.__sigma[index], self.__status[index]
+        sigma0 = np.where(np.isnan(before), np.sqrt((2 * m.pi) / T) * (prices / S), before)
+        (sigma, after) = self.solver.computevolbatch(prices, S, self.__K[index], T, self.__r[index], self.__q[index],
+                                                     self.__typ[index], sigma0)
+        self.__sigma[index], self.__status[index] = sigma, after
+        # nan to nan is no move, converged to not converged is
+        moved = (after != status) | (np.abs(sigma - before) > self.threshold)
+        return index[moved]
+
+if __name__ == "__main__":
+
+    import time
+    from chain import ChainLoader
+
+    chain = OptionChain(ChainLoader.cached("data/stock-options-volume-leaders-06-08-2023.csv"))
+    start = time.perf_counter()
+    engine = VolEngine.fromchain(chain, r = 0.05)
+    print("Contracts: ", len(engine), " full solve: %.4fs" % (time.perf_counter() - start))
+    rng = np.random.default_rng(0)
+    for changed in (10, 100, 1000):
+        index = rng.choice(len(engine), changed, replace = False)
+        prices = engine.prices[index] * rng.uniform(0.99, 1.01, changed)
+        start = time.perf_counter()
+        moved = engine.update(index, prices)
+        print("%5d changed quotes: %.5fs, %d vols moved" % (changed, time.perf_counter() - start, len(moved)))